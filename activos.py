@@ -0,0 +1,112 @@
+"""Build de los archivos estáticos (CSS y JS) con nombre por contenido.
+
+`flask --app app construir-activos` minifica cada archivo de ACTIVOS, le pone
+en el nombre los primeros caracteres de su SHA-256 (`style.3f2a91c0d4.css`) y
+guarda al lado las versiones precomprimidas `.gz` y `.br`, todo en
+static/build, junto con `manifest.json` (nombre original → nombre con hash).
+
+Como el nombre cambia con el contenido, se pueden servir con
+`Cache-Control: immutable` y un año de vida: un cambio de CSS es otra URL.
+Sin manifiesto (desarrollo) `url_activo` devuelve la URL estática de siempre.
+
+rjsmin, rcssmin y Brotli son opcionales: sin ellos el archivo se publica sin
+minificar y solo con la versión gzip.
+"""
+import gzip
+import hashlib
+import json
+import os
+import uuid
+
+try:
+    import rjsmin
+except ImportError:  # rjsmin es opcional
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:  # rcssmin es opcional
+    rcssmin = None
+
+try:
+    import brotli
+except ImportError:  # Brotli es opcional
+    brotli = None
+
+ACTIVOS = ('style.css', 'script.js')
+CARPETA_BUILD = 'build'
+MANIFIESTO = 'manifest.json'
+LARGO_HASH = 10
+
+# Extensión agregada al archivo → valor de Content-Encoding, en orden de preferencia
+CODIFICACIONES = (('.br', 'br'), ('.gz', 'gzip'))
+
+
+def brotli_disponible():
+    return brotli is not None
+
+
+def _minificar(nombre, texto):
+    if nombre.endswith('.css') and rcssmin is not None:
+        return rcssmin.cssmin(texto)
+    if nombre.endswith('.js') and rjsmin is not None:
+        return rjsmin.jsmin(texto)
+    return texto
+
+
+def _escribir_atomico(ruta, contenido):
+    temporal = f'{ruta}.{uuid.uuid4().hex}.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def construir_activos(carpeta_static):
+    """Genera static/build y su manifiesto. Devuelve el manifiesto"""
+    carpeta_build = os.path.join(carpeta_static, CARPETA_BUILD)
+    os.makedirs(carpeta_build, exist_ok=True)
+
+    manifiesto = {}
+    for nombre in ACTIVOS:
+        with open(os.path.join(carpeta_static, nombre), encoding='utf-8') as f:
+            contenido = _minificar(nombre, f.read()).encode('utf-8')
+        base, extension = os.path.splitext(nombre)
+        nombre_build = f'{base}.{hashlib.sha256(contenido).hexdigest()[:LARGO_HASH]}{extension}'
+        ruta = os.path.join(carpeta_build, nombre_build)
+
+        _escribir_atomico(ruta, contenido)
+        # mtime=0 para que el .gz sea idéntico entre builds del mismo contenido
+        _escribir_atomico(f'{ruta}.gz', gzip.compress(contenido, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _escribir_atomico(f'{ruta}.br', brotli.compress(contenido, mode=brotli.MODE_TEXT, quality=11))
+        manifiesto[nombre] = nombre_build
+
+    _escribir_atomico(os.path.join(carpeta_build, MANIFIESTO), json.dumps(manifiesto, indent=2).encode('utf-8'))
+    _borrar_builds_viejos(carpeta_build, manifiesto)
+    return manifiesto
+
+
+def _borrar_builds_viejos(carpeta_build, manifiesto):
+    vigentes = {MANIFIESTO}
+    for nombre_build in manifiesto.values():
+        vigentes.update({nombre_build, f'{nombre_build}.gz', f'{nombre_build}.br'})
+    for nombre in os.listdir(carpeta_build):
+        if nombre not in vigentes:
+            os.remove(os.path.join(carpeta_build, nombre))
+
+
+def cargar_manifiesto(carpeta_static):
+    """Manifiesto del último build, o {} si no se construyeron los activos"""
+    ruta = os.path.join(carpeta_static, CARPETA_BUILD, MANIFIESTO)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def elegir_variante(ruta, codificaciones_aceptadas):
+    """Mejor versión precomprimida aceptada por el cliente: (ruta, Content-Encoding o None)"""
+    for sufijo, codificacion in CODIFICACIONES:
+        if codificaciones_aceptadas[codificacion] and os.path.exists(f'{ruta}{sufijo}'):
+            return f'{ruta}{sufijo}', codificacion
+    return ruta, None
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, redirect, session, url_for, send_file
+from flask import Flask, render_template, request, jsonify, redirect, session, url_for, send_file, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
 from functools import wraps
@@ -6,11 +6,27 @@ import os
 import io
 import json
 import uuid
-from sqlalchemy import inspect, text
+import threading
+import mimetypes
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
-from urllib.parse import quote_plus
+from urllib.parse import quote, quote_plus
 from config import Config
-from models import db, Domo, Reserva, Configuracion, Feriado, GaleriaFoto, Promocion, DocumentoInstrucciones, ReservaPago
+from models import db, Domo, Reserva, Configuracion, Feriado, GaleriaFoto, Promocion, DocumentoInstrucciones, ReservaPago, LoteEnvio
+from migraciones import aplicar_migraciones, version_esquema, ULTIMA_VERSION
+from catalogo import registrar_catalogo, obtener_catalogo, obtener_bootstrap, incrementar_version_catalogo, invalidar_catalogo
+from documentos import guardar_subida, url_documento, ruta_en_disco, leer_contenido, liberar_contenido
+from subidas import SubidaInvalida, recibir_archivo
+from imagenes import encolar_variantes, variantes_de, generar_variantes, registrar_variantes, es_imagen_local, pillow_disponible
+from activos import CARPETA_BUILD, construir_activos, cargar_manifiesto, elegir_variante
+from compresion import comprimir_respuesta
+from envios import smtp_configurado, encolar_lote
+from espejo import EspejoImagenes, ErrorEspejo, host_permitido
+from precios import DESCUENTOS_DEFECTO, validar_descuentos, obtener_reglas, incrementar_version_precios, invalidar_reglas
+from ocupacion import bloquear_domo, rango_ocupado, ocupar_noches, liberar_noches, ocupacion_ventana, reconstruir_ocupacion
+from exportacion import ENCABEZADOS_RESERVAS, ENCABEZADOS_PAGOS, filas_reservas, filas_pagos, generar_csv, generar_xlsx
+from disponibilidad import inicios_libres, reservas_en_ventana, reservas_en_ventana_por_domo
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -26,33 +42,37 @@ os.makedirs(DOCS_FOLDER, exist_ok=True)
 
 db.init_app(app)
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+espejo_imagenes = EspejoImagenes(
+    os.path.join(app.instance_path, 'espejo_imagenes'),
+    app.config['HOSTS_ESPEJO_IMAGENES'],
+    app.config['LIMITE_ESPEJO_IMAGENES'],
+    app.config['REVALIDAR_ESPEJO_SEGUNDOS'],
+    app.config['LIMITE_SUBIDA_IMAGEN']
+)
+
+# Nombres con hash de contenido de CSS/JS (ver activos.py); vacío si no se corrió el build
+manifiesto_activos = cargar_manifiesto(app.static_folder)
+MAX_AGE_ACTIVOS = 365 * 24 * 3600
 
 def save_uploaded_file(file_storage):
-    if not file_storage or file_storage.filename == '':
-        return None
-    if not allowed_file(file_storage.filename):
-        return None
+    """Guarda una imagen subida en uploads. Lanza SubidaInvalida si no es válida"""
+    subido = recibir_archivo(
+        file_storage, ALLOWED_EXTENSIONS, app.config['LIMITE_SUBIDA_IMAGEN'], app.config['UPLOAD_FOLDER']
+    )
     filename = secure_filename(file_storage.filename)
     unique_name = f"{uuid.uuid4().hex}_{filename}"
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_name)
-    file_storage.save(file_path)
+    subido.mover(os.path.join(app.config['UPLOAD_FOLDER'], unique_name))
     return f"/static/uploads/{unique_name}"
 
-def allowed_doc_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_DOC_EXTENSIONS
-
 def save_uploaded_doc(file_storage):
-    if not file_storage or file_storage.filename == '':
-        return None
-    if not allowed_doc_file(file_storage.filename):
-        return None
+    """Guarda un PDF subido en uploads. Lanza SubidaInvalida si no es válido"""
+    subido = recibir_archivo(
+        file_storage, ALLOWED_DOC_EXTENSIONS, app.config['LIMITE_SUBIDA_PDF'], app.config['UPLOAD_FOLDER']
+    )
     filename = secure_filename(file_storage.filename)
     unique_name = f"{uuid.uuid4().hex}_{filename}"
     # Guardar en uploads para mantener el mismo flujo que imágenes
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_name)
-    file_storage.save(file_path)
+    subido.mover(os.path.join(app.config['UPLOAD_FOLDER'], unique_name))
     return f"/static/uploads/{unique_name}"
 
 
@@ -120,77 +140,57 @@ def crear_domos_defecto():
         print(f"✗ Error creando domos: {e}")
         db.session.rollback()
 
+def cargar_datos_defecto():
+    """Domos, feriados y galería por defecto (cada uno verifica si ya existen)"""
+    crear_domos_defecto()
+    crear_feriados_argentina()
+    asegurar_galeria_defecto()
+
 def init_db():
-    """Inicializa las tablas de la base de datos"""
+    """Aplica las migraciones pendientes y carga los datos por defecto"""
     with app.app_context():
+        aplicadas = aplicar_migraciones(sembrar=cargar_datos_defecto)
+        invalidar_reglas()
+        invalidar_catalogo()
+        return aplicadas
+
+def verificar_esquema():
+    """Una consulta de versión; solo migra si la base quedó atrás"""
+    if version_esquema() < ULTIMA_VERSION:
+        init_db()
+        print("✓ Base de datos inicializada")
+
+def calentar_caches():
+    """Carga en memoria las reglas de precios, sus calendarios y el catálogo"""
+    reglas = obtener_reglas()
+    for domo_id in reglas.domos:
+        reglas.calendario(domo_id)
+    obtener_bootstrap()
+
+_worker_listo = False
+_lock_worker = threading.Lock()
+
+def preparar_worker():
+    """Verifica el esquema y precalienta cachés, una vez por proceso.
+
+    Se llama después del fork (hook post_worker_init de gunicorn, o la primera
+    petición con el servidor de desarrollo): importar app.py no toca la base.
+    """
+    global _worker_listo
+    if _worker_listo:
+        return True
+    with _lock_worker:
+        if _worker_listo:
+            return True
         try:
-            db.create_all()
-            crear_domos_defecto()
-            crear_feriados_argentina()
-            asegurar_columnas()
-            asegurar_galeria_defecto()
-            print("✓ Base de datos inicializada")
+            with app.app_context():
+                verificar_esquema()
+                calentar_caches()
         except Exception as e:
-            print(f"✗ Error: {e}")
-
-def asegurar_columnas():
-    """Asegura columnas nuevas sin migraciones formales"""
-    try:
-        inspector = inspect(db.engine)
-        
-        # Columna image_url en promociones
-        if inspector.has_table('promociones'):
-            columnas = [col['name'] for col in inspector.get_columns('promociones')]
-            if 'image_url' not in columnas:
-                db.session.execute(text('ALTER TABLE promociones ADD COLUMN image_url VARCHAR(500)'))
-                db.session.commit()
-        
-        # Columna tipo_check en reservas
-        if inspector.has_table('reservas'):
-            columnas = [col['name'] for col in inspector.get_columns('reservas')]
-            if 'tipo_check' not in columnas:
-                db.session.execute(text("ALTER TABLE reservas ADD COLUMN tipo_check VARCHAR(20) DEFAULT 'normal'"))
-                db.session.commit()
-
-        # Tabla de documentos de instrucciones y compatibilidad de columnas
-        if inspector.has_table('documentos_instrucciones'):
-            columnas_docs = [col['name'] for col in inspector.get_columns('documentos_instrucciones')]
-
-            # Compatibilidad: versiones anteriores usaban archivo_pdf
-            if 'archivo_url' not in columnas_docs:
-                db.session.execute(text("ALTER TABLE documentos_instrucciones ADD COLUMN archivo_url VARCHAR(500)"))
-                db.session.commit()
-
-                if 'archivo_pdf' in columnas_docs:
-                    db.session.execute(text("UPDATE documentos_instrucciones SET archivo_url = archivo_pdf WHERE archivo_url IS NULL"))
-                    db.session.commit()
-
-            # Compatibilidad: usar es_activo como columna base
-            if 'es_activo' not in columnas_docs:
-                db.session.execute(text("ALTER TABLE documentos_instrucciones ADD COLUMN es_activo BOOLEAN DEFAULT FALSE"))
-                db.session.commit()
-
-                if 'activo' in columnas_docs:
-                    db.session.execute(text("UPDATE documentos_instrucciones SET es_activo = activo WHERE es_activo IS NULL"))
-                    db.session.commit()
-
-            # Respaldo en base para entornos efímeros (Railway)
-            if 'archivo_blob' not in columnas_docs:
-                try:
-                    db.session.execute(text("ALTER TABLE documentos_instrucciones ADD COLUMN archivo_blob BYTEA"))
-                except Exception:
-                    db.session.rollback()
-                    db.session.execute(text("ALTER TABLE documentos_instrucciones ADD COLUMN archivo_blob BLOB"))
-                db.session.commit()
-
-        # Tabla de pagos por reserva
-        if not inspector.has_table('reserva_pagos'):
-            db.create_all()
-            db.session.commit()
-                
-    except Exception as e:
-        db.session.rollback()
-        print(f"✗ Error agregando columnas: {e}")
+            print(f"✗ Error preparando el worker: {e}")
+            return False
+        _worker_listo = True
+    return True
 
 def crear_feriados_argentina():
     """Crea los feriados de Argentina 2026"""
@@ -263,8 +263,119 @@ def asegurar_galeria_defecto():
         db.session.rollback()
         print(f"✗ Error agregando galería por defecto: {e}")
 
-# Inicializar al crear la app
-init_db()
+def json_variantes(url):
+    """Variantes ya generadas de una imagen subida (si el trabajo en segundo plano no
+    terminó todavía, las registra él al terminar)"""
+    variantes = variantes_de(app, url)
+    return json.dumps(variantes) if variantes else None
+
+@app.errorhandler(413)
+def archivo_demasiado_grande(e):
+    limite = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'error': f'La petición supera el máximo de {limite} MB'}), 413
+
+@app.before_request
+def asegurar_worker_listo():
+    if not _worker_listo and request.endpoint not in ('healthz', 'static', 'servir_activo'):
+        preparar_worker()
+
+@app.after_request
+def comprimir(respuesta):
+    umbral = app.config['COMPRESION_UMBRAL_BYTES']
+    if not umbral:
+        return respuesta
+    return comprimir_respuesta(
+        respuesta,
+        request.accept_encodings,
+        umbral,
+        app.config['COMPRESION_NIVEL_GZIP'],
+        app.config['COMPRESION_CALIDAD_BROTLI']
+    )
+
+@app.template_global()
+def url_activo(nombre):
+    """URL de un CSS/JS: la versión con hash si hay build, la estática en desarrollo"""
+    if nombre in manifiesto_activos and not app.debug:
+        return url_for('servir_activo', nombre=manifiesto_activos[nombre])
+    return url_for('static', filename=nombre)
+
+@app.route('/activos/<nombre>')
+def servir_activo(nombre):
+    """Activo del build, precomprimido según Accept-Encoding y cacheable para siempre"""
+    if nombre not in manifiesto_activos.values():
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+    ruta, codificacion = elegir_variante(
+        os.path.join(app.static_folder, CARPETA_BUILD, nombre), request.accept_encodings
+    )
+    respuesta = send_file(
+        ruta,
+        mimetype=mimetypes.guess_type(nombre)[0],
+        conditional=True,
+        etag=f"{nombre}-{codificacion or 'identity'}",
+        max_age=MAX_AGE_ACTIVOS
+    )
+    if codificacion:
+        respuesta.headers['Content-Encoding'] = codificacion
+    respuesta.vary.add('Accept-Encoding')
+    respuesta.cache_control.immutable = True
+    return respuesta
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: el proceso responde (no consulta la base)"""
+    return jsonify({'estado': 'ok'}), 200
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: esquema verificado, cachés calientes y base accesible"""
+    if not preparar_worker():
+        return jsonify({'estado': 'no_listo'}), 503
+    try:
+        db.session.execute(text('SELECT 1'))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'estado': 'no_listo', 'error': str(e)}), 503
+    return jsonify({'estado': 'listo', 'version_esquema': ULTIMA_VERSION}), 200
+
+@app.cli.command('db-upgrade')
+def db_upgrade_cmd():
+    """Aplica las migraciones de esquema pendientes y los datos por defecto"""
+    aplicadas = init_db()
+    if aplicadas:
+        print(f"✓ Esquema actualizado a la versión {aplicadas[-1]}")
+    else:
+        print(f"✓ Esquema al día (versión {ULTIMA_VERSION})")
+
+@app.cli.command('reconstruir-ocupacion')
+def reconstruir_ocupacion_cmd():
+    """Regenera la tabla ocupacion_domos desde las reservas confirmadas"""
+    filas = reconstruir_ocupacion()
+    print(f"✓ Mapas de ocupación reconstruidos ({filas} domo/año)")
+
+@app.cli.command('construir-activos')
+def construir_activos_cmd():
+    """Minifica y precomprime CSS/JS con nombres por contenido (static/build)"""
+    manifiesto = construir_activos(app.static_folder)
+    for nombre, nombre_build in manifiesto.items():
+        print(f"✓ {nombre} → {nombre_build}")
+
+@app.cli.command('generar-variantes')
+def generar_variantes_cmd():
+    """Genera las variantes responsivas que falten de las imágenes subidas"""
+    if not pillow_disponible():
+        print("✗ Falta instalar Pillow")
+        return
+    urls = {f.url for f in GaleriaFoto.query.all()} | {p.image_url for p in Promocion.query.all()}
+    generadas = 0
+    for url in sorted(u for u in urls if es_imagen_local(u)):
+        try:
+            registrar_variantes(url, generar_variantes(app, url))
+            generadas += 1
+        except OSError as e:
+            print(f"✗ {url}: {e}")
+    incrementar_version_catalogo()
+    db.session.commit()
+    print(f"✓ Variantes generadas para {generadas} imágenes")
 
 @app.route('/migrate-db', methods=['POST'])
 def migrate_db():
@@ -276,6 +387,8 @@ def migrate_db():
             db.create_all()
             crear_domos_defecto()
             crear_feriados_argentina()
+            invalidar_reglas()
+            invalidar_catalogo()
         return jsonify({'mensaje': 'Base de datos migrada exitosamente'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -298,6 +411,8 @@ def init_db_route():
             db.session.add(domo)
         
         db.session.commit()
+        invalidar_reglas()
+        invalidar_catalogo()
         return jsonify({'mensaje': 'Base de datos inicializada'}), 200
     except Exception as e:
         db.session.rollback()
@@ -307,13 +422,25 @@ def init_db_route():
 
 @app.route('/')
 def index():
-    """Página principal con calendario de reservas"""
-    domos = Domo.query.all()
-    return render_template('index.html', domos=domos)
+    """Página principal con calendario de reservas.
 
-@app.route('/api/domos')
-def get_domos():
-    """Retorna la lista de domos en formato JSON"""
+    Domos, galería y promociones van embebidos en el HTML (desde la caché del
+    catálogo) para que la portada no dependa de tres pedidos más a la API.
+    """
+    return render_template('index.html', bootstrap=obtener_bootstrap())
+
+MAX_AGE_CATALOGO = 60
+
+def responder_catalogo(nombre):
+    """Responde una lista del catálogo desde la caché, con ETag y 304 si no cambió"""
+    entrada = obtener_catalogo(nombre)
+    respuesta = Response(entrada.cuerpo, mimetype='application/json')
+    respuesta.set_etag(entrada.etag)
+    respuesta.headers['Cache-Control'] = f'public, max-age={MAX_AGE_CATALOGO}'
+    return respuesta.make_conditional(request)
+
+@registrar_catalogo('domos')
+def catalogo_domos():
     domos = Domo.query.all()
     
     # Si no hay domos, crear los por defecto
@@ -332,43 +459,136 @@ def get_domos():
             'precio_fin_semana': domo.precio_fin_semana,
             'imagen': f'/static/img/domo{domo.id}.jpg'
         })
-    return jsonify(resultado), 200
+    return resultado
+
+def url_espejo(url):
+    """URL propia para una imagen de un host externo permitido; las demás quedan igual"""
+    if host_permitido(url, app.config['HOSTS_ESPEJO_IMAGENES']):
+        return f"/api/imagenes/espejo?url={quote(url, safe='')}"
+    return url
+
+@registrar_catalogo('galeria')
+def catalogo_galeria():
+    fotos = GaleriaFoto.query.order_by(GaleriaFoto.orden.asc(), GaleriaFoto.id.asc()).all()
+    return [{**f.to_dict(), 'url': url_espejo(f.url)} for f in fotos]
+
+@registrar_catalogo('promociones')
+def catalogo_promociones():
+    promos = Promocion.query.filter_by(activo=True).order_by(Promocion.orden.asc(), Promocion.id.asc()).all()
+    return [{**p.to_dict(), 'image_url': url_espejo(p.image_url)} for p in promos]
+
+MAX_AGE_ESPEJO = 30 * 24 * 3600
+
+@app.route('/api/imagenes/espejo')
+def imagen_espejo():
+    """Sirve desde nuestro origen una imagen externa (hosts permitidos), espejada en disco"""
+    url = request.args.get('url') or ''
+    if not host_permitido(url, app.config['HOSTS_ESPEJO_IMAGENES']):
+        return jsonify({'error': 'Origen de imagen no permitido'}), 400
+    try:
+        ruta, meta = espejo_imagenes.obtener(url)
+    except ErrorEspejo as e:
+        return jsonify({'error': str(e)}), e.status
+    return send_file(ruta, mimetype=meta['tipo'], conditional=True, etag=meta['sha256'], max_age=MAX_AGE_ESPEJO)
+
+@app.route('/api/domos')
+def get_domos():
+    """Retorna la lista de domos en formato JSON"""
+    return responder_catalogo('domos')
 
 
 @app.route('/api/galeria')
 def get_galeria():
     """Retorna las fotos de la galería"""
-    fotos = GaleriaFoto.query.order_by(GaleriaFoto.orden.asc(), GaleriaFoto.id.asc()).all()
-    return jsonify([f.to_dict() for f in fotos]), 200
+    return responder_catalogo('galeria')
 
 
 @app.route('/api/promociones')
 def get_promociones():
     """Retorna las promociones activas"""
-    promos = Promocion.query.filter_by(activo=True).order_by(Promocion.orden.asc(), Promocion.id.asc()).all()
-    return jsonify([p.to_dict() for p in promos]), 200
+    return responder_catalogo('promociones')
+
+def parsear_ventana():
+    """Lee los parámetros desde/hasta (YYYY-MM-DD, opcionales) de la query string"""
+    desde_str = request.args.get('desde')
+    hasta_str = request.args.get('hasta')
+    desde = datetime.strptime(desde_str, '%Y-%m-%d').date() if desde_str else None
+    hasta = datetime.strptime(hasta_str, '%Y-%m-%d').date() if hasta_str else None
+    if desde and hasta and hasta < desde:
+        raise ValueError('hasta debe ser posterior a desde')
+    return desde, hasta
+
+@app.route('/api/disponibilidad')
+def get_disponibilidad_domos():
+    """Retorna los rangos ocupados de todos los domos (o los pedidos en `domos`).
+
+    Sin ventana explícita usa el próximo año desde hoy. Siempre responde en
+    formato de rangos [entrada, salida), agrupados por domo.
+    """
+    try:
+        desde, hasta = parsear_ventana()
+    except ValueError as e:
+        return jsonify({'error': f'Ventana de fechas inválida: {str(e)}'}), 400
+    desde = desde or datetime.utcnow().date()
+    hasta = hasta or desde + timedelta(days=365)
+    
+    domos_param = request.args.get('domos')
+    if domos_param:
+        try:
+            domo_ids = [int(d) for d in domos_param.split(',') if d.strip()]
+        except ValueError:
+            return jsonify({'error': 'Lista de domos inválida'}), 400
+    else:
+        domo_ids = [d.id for d in db.session.query(Domo.id).all()]
+    
+    por_domo = reservas_en_ventana_por_domo(domo_ids, desde, hasta)
+    return jsonify({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'domos': {
+            str(domo_id): [[inicio.isoformat(), fin.isoformat()] for inicio, fin in reservas]
+            for domo_id, reservas in por_domo.items()
+        }
+    }), 200
 
 @app.route('/api/disponibilidad/<int:domo_id>')
 def get_disponibilidad(domo_id):
-    """Retorna las fechas ocupadas y de checkout de un domo"""
-    reservas = Reserva.query.filter_by(domo_id=domo_id, estado='confirmada').all()
+    """Retorna las fechas ocupadas y de checkout de un domo.
+
+    Acepta `desde`/`hasta` para acotar la ventana y `formato=rangos` para
+    devolver pares [entrada, salida) en lugar de una fecha por noche.
+    """
+    try:
+        desde, hasta = parsear_ventana()
+    except ValueError as e:
+        return jsonify({'error': f'Ventana de fechas inválida: {str(e)}'}), 400
+    
+    reservas = reservas_en_ventana(domo_id, desde, hasta)
+    
+    if request.args.get('formato') == 'rangos':
+        return jsonify({
+            'desde': desde.isoformat() if desde else None,
+            'hasta': hasta.isoformat() if hasta else None,
+            'rangos': [[inicio.isoformat(), fin.isoformat()] for inicio, fin in reservas]
+        }), 200
     
     ocupadas = []
     checkouts = []
     inicios = []
     
-    for reserva in reservas:
+    for fecha_inicio, fecha_fin in reservas:
         # Inicio de reserva
-        inicios.append(reserva.fecha_inicio.isoformat())
+        inicios.append(fecha_inicio.isoformat())
 
         # Ocupadas: desde fecha_inicio hasta fecha_fin-1 (noches en que está ocupado)
-        fecha_actual = reserva.fecha_inicio
-        while fecha_actual < reserva.fecha_fin:
+        fecha_actual = max(fecha_inicio, desde) if desde else fecha_inicio
+        limite = min(fecha_fin, hasta + timedelta(days=1)) if hasta else fecha_fin
+        while fecha_actual < limite:
             ocupadas.append(fecha_actual.isoformat())
             fecha_actual += timedelta(days=1)
         
         # Checkouts: la fecha_fin se muestra como "checkout" (salida pero disponible como entrada siguiente)
-        checkouts.append(reserva.fecha_fin.isoformat())
+        checkouts.append(fecha_fin.isoformat())
     
     return jsonify({'ocupadas': ocupadas, 'checkouts': checkouts, 'inicios': inicios}), 200
 
@@ -386,57 +606,135 @@ def calcular_precio():
     except Exception as e:
         return jsonify({'error': f'Formato de fecha inválido: {str(e)}'}), 400
     
-    domo = Domo.query.get(domo_id)
-    if not domo:
+    reglas = obtener_reglas()
+    try:
+        domo_id = int(domo_id)
+    except (TypeError, ValueError):
+        domo_id = None
+    if domo_id not in reglas.domos:
         return jsonify({'error': 'Domo no encontrado'}), 404
     
-    # Calcular cantidad de noches
-    cantidad_noches = (fecha_fin - fecha_inicio).days
-    if cantidad_noches <= 0:
+    if fecha_fin <= fecha_inicio:
         return jsonify({'error': 'La fecha final debe ser posterior a la inicial'}), 400
     
-    # Calcular precio por noche
-    precio_total = 0
-    fecha_actual = fecha_inicio
+    return jsonify(reglas.cotizar(domo_id, fecha_inicio, fecha_fin)), 200
+
+MAX_COTIZACIONES = 100
+
+@app.route('/api/cotizaciones', methods=['POST'])
+def cotizaciones():
+    """Cotiza y verifica disponibilidad de varias combinaciones (domo, fechas) a la vez.
+
+    Recibe {"cotizaciones": [{"domo_id", "fecha_inicio", "fecha_fin"}, ...]} y
+    responde en el mismo orden. Usa una sola foto de reglas de precios y una
+    sola lectura del mapa de ocupación para todos los domos involucrados.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('cotizaciones') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Se requiere una lista de cotizaciones'}), 400
+    if len(items) > MAX_COTIZACIONES:
+        return jsonify({'error': f'Máximo {MAX_COTIZACIONES} cotizaciones por consulta'}), 400
+    
+    reglas = obtener_reglas()
+    pedidos = []
+    for item in items:
+        try:
+            domo_id = int(item.get('domo_id'))
+            fecha_inicio = datetime.strptime(item.get('fecha_inicio'), '%Y-%m-%d').date()
+            fecha_fin = datetime.strptime(item.get('fecha_fin'), '%Y-%m-%d').date()
+        except (AttributeError, TypeError, ValueError):
+            pedidos.append((item, None, 'Datos inválidos'))
+            continue
+        if domo_id not in reglas.domos:
+            pedidos.append((item, None, 'Domo no encontrado'))
+        elif fecha_fin <= fecha_inicio:
+            pedidos.append((item, None, 'La fecha final debe ser posterior a la inicial'))
+        else:
+            pedidos.append((item, (domo_id, fecha_inicio, fecha_fin), None))
+    
+    validos = [p for _, p, _ in pedidos if p]
+    ocupacion = {}
+    desde = None
+    if validos:
+        # El mismo mapa de ocupación que consulta crear_reserva, para toda la
+        # ventana de una vez; no depende de que las reservas no se superpongan
+        desde = min(inicio for _, inicio, _ in validos)
+        hasta = max(fin for _, _, fin in validos)
+        ocupacion = ocupacion_ventana({domo_id for domo_id, _, _ in validos}, desde, (hasta - desde).days)
+    
+    resultado = []
+    for item, pedido, error in pedidos:
+        if error:
+            resultado.append({**(item if isinstance(item, dict) else {}), 'error': error})
+            continue
+        domo_id, fecha_inicio, fecha_fin = pedido
+        resultado.append({
+            'domo_id': domo_id,
+            'fecha_inicio': fecha_inicio.isoformat(),
+            'fecha_fin': fecha_fin.isoformat(),
+            'disponible': not any(ocupacion[domo_id][(fecha_inicio - desde).days:(fecha_fin - desde).days]),
+            **reglas.cotizar(domo_id, fecha_inicio, fecha_fin)
+        })
     
-    # Obtener feriados
+    return jsonify({'cotizaciones': resultado}), 200
+
+MAX_DIAS_BUSQUEDA = 366
+MAX_NOCHES_BUSQUEDA = 60
+
+@app.route('/api/busqueda-flexible')
+def busqueda_flexible():
+    """Todas las fechas de entrada libres para una estadía de N noches, con su precio.
+
+    Parámetros: `noches` (obligatorio), `capacidad` (opcional) y la ventana de
+    entradas como `mes=YYYY-MM` o `desde`/`hasta`. Las salidas pueden caer
+    después de la ventana.
+    """
     try:
-        feriados = {f.fecha for f in Feriado.query.all()}
-    except:
-        feriados = set()
+        noches = int(request.args.get('noches', ''))
+        capacidad = int(request.args.get('capacidad') or 1)
+    except ValueError:
+        return jsonify({'error': 'noches y capacidad deben ser números'}), 400
+    if not 1 <= noches <= MAX_NOCHES_BUSQUEDA:
+        return jsonify({'error': f'noches debe estar entre 1 y {MAX_NOCHES_BUSQUEDA}'}), 400
     
-    while fecha_actual < fecha_fin:
-        # Verificar si es feriado o fin de semana
-        es_feriado = fecha_actual in feriados
-        # Viernes=4, Sábado=5, Domingo=6
-        es_fin_semana = fecha_actual.weekday() >= 4
-        
-        if es_feriado or es_fin_semana:
-            precio_total += domo.precio_fin_semana
+    try:
+        mes = request.args.get('mes')
+        if mes:
+            desde = datetime.strptime(mes, '%Y-%m').date()
+            hasta = (desde.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
         else:
-            precio_total += domo.precio_semana
-        
-        fecha_actual += timedelta(days=1)
+            desde, hasta = parsear_ventana()
+    except ValueError as e:
+        return jsonify({'error': f'Ventana de fechas inválida: {str(e)}'}), 400
+    if not desde or not hasta:
+        return jsonify({'error': 'Indicá mes o desde/hasta'}), 400
     
-    # Aplicar descuento si aplica (simplificado, sin configuración)
-    descuento = 0
-    porcentaje_descuento = 0
+    desde = max(desde, datetime.utcnow().date())
+    dias = (hasta - desde).days + 1
+    if dias > MAX_DIAS_BUSQUEDA:
+        return jsonify({'error': f'La ventana no puede superar {MAX_DIAS_BUSQUEDA} días'}), 400
     
-    # Descuentos básicos por cantidad de noches
-    if cantidad_noches >= 7:
-        porcentaje_descuento = 0.15  # 15% por 7+ noches
-    elif cantidad_noches >= 3:
-        porcentaje_descuento = 0.10  # 10% por 3+ noches
+    reglas = obtener_reglas()
+    domo_ids = [domo_id for domo_id, cap in reglas.capacidades.items() if cap >= capacidad]
+    resultado = {str(domo_id): [] for domo_id in domo_ids}
+    if dias <= 0 or not domo_ids:
+        return jsonify({'noches': noches, 'domos': resultado}), 200
     
-    descuento = precio_total * porcentaje_descuento
-    precio_con_descuento = precio_total - descuento
+    fin_total = desde + timedelta(days=dias + noches)
+    por_domo = ocupacion_ventana(domo_ids, desde, dias + noches)
+    for domo_id, ocupacion in por_domo.items():
+        calendario = reglas.calendario_para(domo_id, desde, fin_total)
+        for offset in inicios_libres(ocupacion, dias, noches):
+            fecha_inicio = desde + timedelta(days=offset)
+            fecha_fin = fecha_inicio + timedelta(days=noches)
+            resultado[str(domo_id)].append({
+                'fecha_inicio': fecha_inicio.isoformat(),
+                'fecha_fin': fecha_fin.isoformat(),
+                **reglas.cotizar(domo_id, fecha_inicio, fecha_fin, calendario)
+            })
     
-    return jsonify({
-        'precio_base': int(precio_total),
-        'descuento': int(descuento),
-        'precio_total': int(precio_con_descuento),
-        'noches': cantidad_noches
-    }), 200
+    return jsonify({'noches': noches, 'domos': resultado}), 200
 
 @app.route('/api/crear-reserva', methods=['POST'])
 def crear_reserva():
@@ -456,64 +754,27 @@ def crear_reserva():
     if not telefono:
         return jsonify({'error': 'Debes proporcionar un teléfono'}), 400
     
+    if fecha_fin <= fecha_inicio:
+        return jsonify({'error': 'La fecha final debe ser posterior a la inicial'}), 400
+    
     try:
-        # Verificar disponibilidad usando SQL raw para evitar problemas con nombres de columnas
-        from sqlalchemy import text
-        
-        sql = text("""
-            SELECT COUNT(*) as count FROM reservas 
-            WHERE domo_id = :domo_id 
-            AND estado = 'confirmada'
-            AND fecha_inicio < :fecha_fin 
-            AND fecha_fin > :fecha_inicio
-        """)
-        
-        result = db.session.execute(sql, {
-            'domo_id': data['domo_id'],
-            'fecha_fin': fecha_fin,
-            'fecha_inicio': fecha_inicio
-        }).fetchone()
-        
-        if result[0] > 0:
-            return jsonify({'error': 'Estas fechas no están disponibles'}), 409
-        
-        domo = Domo.query.get(data['domo_id'])
-        if not domo:
+        domo_id = int(data.get('domo_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Domo no encontrado'}), 404
+    
+    try:
+        reglas = obtener_reglas()
+        if domo_id not in reglas.domos:
             return jsonify({'error': 'Domo no encontrado'}), 404
         
-        cantidad_noches = (fecha_fin - fecha_inicio).days
-        
-        # Calcular precio total
-        precio_total = 0
-        fecha_actual = fecha_inicio
-        
-        # Obtener feriados
-        try:
-            feriados = {f.fecha for f in Feriado.query.all()}
-        except:
-            feriados = set()
-        
-        while fecha_actual < fecha_fin:
-            es_feriado = fecha_actual in feriados
-            es_fin_semana = fecha_actual.weekday() >= 4  # Viernes=4, Sábado=5, Domingo=6
-            
-            if es_feriado or es_fin_semana:
-                precio_total += domo.precio_fin_semana
-            else:
-                precio_total += domo.precio_semana
-            
-            fecha_actual += timedelta(days=1)
-        
-        # Aplicar descuento si aplica
-        if cantidad_noches >= 7:
-            porcentaje_descuento = 0.15  # 15% por 7+ noches
-        elif cantidad_noches >= 3:
-            porcentaje_descuento = 0.10  # 10% por 3+ noches
-        else:
-            porcentaje_descuento = 0
+        # Verificación contra el mapa de ocupación persistente, con el domo
+        # bloqueado para que dos workers no reserven las mismas noches
+        bloquear_domo(domo_id)
+        if rango_ocupado(domo_id, fecha_inicio, fecha_fin, bloquear=True):
+            db.session.rollback()
+            return jsonify({'error': 'Estas fechas no están disponibles'}), 409
         
-        descuento = precio_total * porcentaje_descuento
-        precio_con_descuento = precio_total - descuento
+        cotizacion = reglas.cotizar(domo_id, fecha_inicio, fecha_fin)
         
         # Insertar reserva usando SQL raw para compatibilidad
         sql_insert = text("""
@@ -527,7 +788,7 @@ def crear_reserva():
         """)
         
         db.session.execute(sql_insert, {
-            'domo_id': data['domo_id'],
+            'domo_id': domo_id,
             'nombre_cliente': data['nombre_cliente'],
             'email': email,
             'telefono': telefono,
@@ -535,14 +796,20 @@ def crear_reserva():
             'fecha_fin': fecha_fin,
             'fecha_creacion': datetime.utcnow()
         })
+        ocupar_noches(domo_id, fecha_inicio, fecha_fin)
         
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'mensaje': 'Reserva creada exitosamente'
+            'mensaje': 'Reserva creada exitosamente',
+            'precio': cotizacion
         }), 201
         
+    except IntegrityError:
+        # Restricción de exclusión de PostgreSQL: otra reserva ganó las mismas noches
+        db.session.rollback()
+        return jsonify({'error': 'Estas fechas no están disponibles'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Error al crear reserva: {str(e)}'}), 500
@@ -574,18 +841,99 @@ def admin_dashboard():
     """Panel de control del administrador"""
     return render_template('admin_dashboard.html')
 
+LIMITE_RESERVAS_ADMIN = 50
+MAX_LIMITE_RESERVAS_ADMIN = 200
+
+
+def filtrar_reservas(consulta, desde=None, hasta=None, fin_antes=None):
+    """Aplica los filtros del listado de reservas a una consulta de reservas ⟕ domos.
+
+    Lanza ValueError si domo_id no es un número.
+    """
+    if request.args.get('domo_id'):
+        consulta = consulta.filter(Reserva.domo_id == int(request.args['domo_id']))
+    if request.args.get('estado'):
+        consulta = consulta.filter(Reserva.estado == request.args['estado'])
+    if request.args.get('tipo_check'):
+        # Las reservas creadas sin DEFAULT en la columna quedan con NULL = 'normal'
+        consulta = consulta.filter(db.func.coalesce(Reserva.tipo_check, 'normal') == request.args['tipo_check'])
+    if desde:
+        consulta = consulta.filter(Reserva.fecha_fin >= desde)
+    if hasta:
+        consulta = consulta.filter(Reserva.fecha_inicio <= hasta)
+    if fin_antes:
+        consulta = consulta.filter(Reserva.fecha_fin < fin_antes)
+    busqueda = (request.args.get('q') or '').strip()
+    if busqueda:
+        patron = f'%{busqueda}%'
+        consulta = consulta.filter(db.or_(
+            Reserva.nombre_cliente.ilike(patron),
+            Reserva.email_cliente.ilike(patron),
+            Reserva.telefono_cliente.ilike(patron),
+            Domo.nombre.ilike(patron)
+        ))
+    return consulta
+
+
 @app.route('/api/admin/reservas')
 @admin_required
 def get_reservas_admin():
-    """Obtiene todas las reservas (solo admin)"""
-    reservas = Reserva.query.all()
-    return jsonify([
-        {
-            **r.to_dict(),
-            'domo_nombre': r.domo.nombre if r.domo else None
-        }
-        for r in reservas
-    ]), 200
+    """Lista paginada de reservas (solo admin).
+
+    Filtros opcionales: domo_id, estado, tipo_check, desde (fecha_fin >= desde),
+    hasta (fecha_inicio <= hasta), fin_antes (fecha_fin < fin_antes) y q (cliente,
+    email, teléfono o domo). Paginación por cursor sobre (fecha_inicio, id):
+    `cursor` es el valor `siguiente` de la página anterior.
+    """
+    orden_asc = request.args.get('orden') == 'asc'
+    try:
+        limite = min(int(request.args.get('limite') or LIMITE_RESERVAS_ADMIN), MAX_LIMITE_RESERVAS_ADMIN)
+        if limite < 1:
+            raise ValueError('limite debe ser mayor a 0')
+        desde, hasta = parsear_ventana()
+        fin_antes_str = request.args.get('fin_antes')
+        fin_antes = datetime.strptime(fin_antes_str, '%Y-%m-%d').date() if fin_antes_str else None
+        cursor = request.args.get('cursor')
+        if cursor:
+            cursor_fecha_str, cursor_id_str = cursor.split('_', 1)
+            cursor_fecha = datetime.strptime(cursor_fecha_str, '%Y-%m-%d').date()
+            cursor_id = int(cursor_id_str)
+        consulta = filtrar_reservas(
+            db.session.query(Reserva, Domo.nombre).outerjoin(Domo, Reserva.domo_id == Domo.id),
+            desde, hasta, fin_antes
+        )
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros inválidos: {str(e)}'}), 400
+    
+    if cursor:
+        if orden_asc:
+            consulta = consulta.filter(db.or_(
+                Reserva.fecha_inicio > cursor_fecha,
+                db.and_(Reserva.fecha_inicio == cursor_fecha, Reserva.id > cursor_id)
+            ))
+        else:
+            consulta = consulta.filter(db.or_(
+                Reserva.fecha_inicio < cursor_fecha,
+                db.and_(Reserva.fecha_inicio == cursor_fecha, Reserva.id < cursor_id)
+            ))
+    
+    if orden_asc:
+        consulta = consulta.order_by(Reserva.fecha_inicio.asc(), Reserva.id.asc())
+    else:
+        consulta = consulta.order_by(Reserva.fecha_inicio.desc(), Reserva.id.desc())
+    
+    # Se pide una fila de más para saber si hay otra página
+    filas = consulta.limit(limite + 1).all()
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1][0]
+        siguiente = f"{ultima.fecha_inicio.isoformat()}_{ultima.id}"
+    
+    return jsonify({
+        'reservas': [{**r.to_dict(), 'domo_nombre': domo_nombre} for r, domo_nombre in filas],
+        'siguiente': siguiente
+    }), 200
 
 @app.route('/api/admin/domos')
 @admin_required
@@ -611,7 +959,11 @@ def actualizar_domo(domo_id):
     if 'descripcion' in data:
         domo.descripcion = data['descripcion']
     
+    incrementar_version_precios()
+    incrementar_version_catalogo()
     db.session.commit()
+    invalidar_reglas()
+    invalidar_catalogo()
     return jsonify({'mensaje': 'Domo actualizado', 'domo': domo.to_dict()}), 200
 
 @app.route('/api/admin/reserva/<int:reserva_id>', methods=['DELETE'])
@@ -623,7 +975,11 @@ def cancelar_reserva(reserva_id):
     if not reserva:
         return jsonify({'error': 'Reserva no encontrada'}), 404
     
+    estaba_confirmada = reserva.estado == 'confirmada'
     reserva.estado = 'cancelada'
+    if estaba_confirmada:
+        bloquear_domo(reserva.domo_id)
+        liberar_noches(reserva.domo_id, reserva.fecha_inicio, reserva.fecha_fin, reserva.id)
     db.session.commit()
     
     return jsonify({'mensaje': 'Reserva cancelada'}), 200
@@ -657,7 +1013,12 @@ def eliminar_reserva_definitiva(reserva_id):
     if not reserva:
         return jsonify({'error': 'Reserva no encontrada'}), 404
 
+    estaba_confirmada = reserva.estado == 'confirmada'
+    domo_id, fecha_inicio, fecha_fin = reserva.domo_id, reserva.fecha_inicio, reserva.fecha_fin
     db.session.delete(reserva)
+    if estaba_confirmada:
+        bloquear_domo(domo_id)
+        liberar_noches(domo_id, fecha_inicio, fecha_fin, reserva_id)
     db.session.commit()
 
     return jsonify({'mensaje': 'Reserva eliminada'}), 200
@@ -684,9 +1045,11 @@ def admin_galeria_crear():
         return jsonify({'error': 'URL requerida'}), 400
 
     try:
-        foto = GaleriaFoto(url=url_foto, titulo=titulo, orden=int(orden))
+        foto = GaleriaFoto(url=url_foto, titulo=titulo, orden=int(orden), variantes=json_variantes(url_foto))
         db.session.add(foto)
+        incrementar_version_catalogo()
         db.session.commit()
+        invalidar_catalogo()
         return jsonify(foto.to_dict()), 201
     except Exception as e:
         db.session.rollback()
@@ -698,10 +1061,12 @@ def admin_galeria_crear():
 def admin_galeria_upload():
     if 'file' not in request.files:
         return jsonify({'error': 'Archivo requerido'}), 400
-    archivo = request.files['file']
-    url_foto = save_uploaded_file(archivo)
-    if not url_foto:
-        return jsonify({'error': 'Archivo inválido'}), 400
+    try:
+        url_foto = save_uploaded_file(request.files['file'])
+    except SubidaInvalida as e:
+        return jsonify({'error': str(e)}), e.status
+    # Las variantes WebP/JPEG se generan en segundo plano
+    encolar_variantes(app, url_foto, incrementar_version_catalogo)
     return jsonify({'url': url_foto}), 201
 
 
@@ -714,7 +1079,9 @@ def admin_galeria_eliminar(foto_id):
 
     try:
         db.session.delete(foto)
+        incrementar_version_catalogo()
         db.session.commit()
+        invalidar_catalogo()
         return jsonify({'mensaje': 'Foto eliminada'}), 200
     except Exception as e:
         db.session.rollback()
@@ -750,11 +1117,14 @@ def admin_promociones_crear():
             descripcion=descripcion,
             detalle=detalle,
             image_url=image_url,
+            variantes=json_variantes(image_url),
             orden=int(orden),
             activo=activo
         )
         db.session.add(promo)
+        incrementar_version_catalogo()
         db.session.commit()
+        invalidar_catalogo()
         return jsonify(promo.to_dict()), 201
     except Exception as e:
         db.session.rollback()
@@ -766,10 +1136,12 @@ def admin_promociones_crear():
 def admin_promociones_upload():
     if 'file' not in request.files:
         return jsonify({'error': 'Archivo requerido'}), 400
-    archivo = request.files['file']
-    url_foto = save_uploaded_file(archivo)
-    if not url_foto:
-        return jsonify({'error': 'Archivo inválido'}), 400
+    try:
+        url_foto = save_uploaded_file(request.files['file'])
+    except SubidaInvalida as e:
+        return jsonify({'error': str(e)}), e.status
+    # Las variantes WebP/JPEG se generan en segundo plano
+    encolar_variantes(app, url_foto, incrementar_version_catalogo)
     return jsonify({'url': url_foto}), 201
 
 
@@ -784,12 +1156,17 @@ def admin_promociones_actualizar(promo_id):
     promo.titulo = (data.get('titulo') or promo.titulo).strip()
     promo.descripcion = (data.get('descripcion') or promo.descripcion).strip()
     promo.detalle = (data.get('detalle') or promo.detalle)
-    promo.image_url = (data.get('image_url') or promo.image_url)
+    nueva_imagen = data.get('image_url')
+    if nueva_imagen and nueva_imagen != promo.image_url:
+        promo.image_url = nueva_imagen
+        promo.variantes = json_variantes(nueva_imagen)
     promo.orden = int(data.get('orden', promo.orden))
     promo.activo = bool(data.get('activo', promo.activo))
 
     try:
+        incrementar_version_catalogo()
         db.session.commit()
+        invalidar_catalogo()
         return jsonify(promo.to_dict()), 200
     except Exception as e:
         db.session.rollback()
@@ -805,7 +1182,9 @@ def admin_promociones_eliminar(promo_id):
 
     try:
         db.session.delete(promo)
+        incrementar_version_catalogo()
         db.session.commit()
+        invalidar_catalogo()
         return jsonify({'mensaje': 'Promoción eliminada'}), 200
     except Exception as e:
         db.session.rollback()
@@ -842,32 +1221,21 @@ def admin_documentos_instrucciones_crear():
     if not archivo:
         return jsonify({'error': 'Archivo requerido'}), 400
 
-    if not allowed_doc_file(archivo.filename or ''):
-        return jsonify({'error': 'Archivo inválido. Solo PDF'}), 400
-
-    contenido_pdf = archivo.read()
-    if not contenido_pdf:
-        return jsonify({'error': 'El PDF está vacío'}), 400
-
-    filename = secure_filename(archivo.filename)
-    unique_name = f"{uuid.uuid4().hex}_{filename}"
-    url_doc = f"/static/uploads/{unique_name}"
-    ruta_archivo = os.path.join(app.config['UPLOAD_FOLDER'], unique_name)
-
-    # Mejor esfuerzo: guardar también en disco
     try:
-        with open(ruta_archivo, 'wb') as f:
-            f.write(contenido_pdf)
-    except Exception:
-        pass
+        subido = recibir_archivo(archivo, ALLOWED_DOC_EXTENSIONS, app.config['LIMITE_SUBIDA_PDF'], app.config['DOCS_FOLDER'])
+    except SubidaInvalida as e:
+        return jsonify({'error': str(e)}), e.status
 
     try:
+        # Un PDF ya subido (mismo hash) reutiliza el contenido guardado
+        sha256, tamanio = guardar_subida(subido)
         existe_activo = DocumentoInstrucciones.query.filter_by(activo=True).first() is not None
         doc = DocumentoInstrucciones(
             nombre=nombre,
             descripcion=descripcion,
-            archivo_url=url_doc,
-            archivo_blob=contenido_pdf,
+            archivo_url=url_documento(sha256),
+            sha256=sha256,
+            tamanio=tamanio,
             activo=not existe_activo
         )
         db.session.add(doc)
@@ -875,6 +1243,7 @@ def admin_documentos_instrucciones_crear():
         return jsonify(doc.to_dict()), 201
     except Exception as e:
         db.session.rollback()
+        subido.descartar()
         return jsonify({'error': str(e)}), 500
 
 
@@ -903,11 +1272,16 @@ def admin_documentos_instrucciones_eliminar(documento_id):
         return jsonify({'error': 'Documento no encontrado'}), 404
 
     try:
-        ruta_archivo = resolver_ruta_documento(doc.archivo_url)
-        if ruta_archivo and os.path.exists(ruta_archivo):
-            os.remove(ruta_archivo)
-
-        db.session.delete(doc)
+        if doc.sha256:
+            db.session.delete(doc)
+            db.session.flush()
+            # El contenido se borra solo si ningún otro documento lo comparte
+            liberar_contenido(doc.sha256)
+        else:
+            ruta_archivo = resolver_ruta_documento(doc.archivo_url)
+            if ruta_archivo and os.path.exists(ruta_archivo):
+                os.remove(ruta_archivo)
+            db.session.delete(doc)
         db.session.commit()
         return jsonify({'mensaje': 'Documento eliminado'}), 200
     except Exception as e:
@@ -915,37 +1289,112 @@ def admin_documentos_instrucciones_eliminar(documento_id):
         return jsonify({'error': str(e)}), 500
 
 
+MAX_AGE_DOCUMENTOS = 3600
+
 @app.route('/api/documentos-instrucciones/<int:documento_id>/archivo')
 def ver_documento_instrucciones(documento_id):
+    """Sirve el PDF desde disco por bloques, con Range, ETag (su SHA-256) y Last-Modified.
+
+    Si el archivo no está en disco (deploy efímero) se repone una vez desde el
+    almacén en BD; el contenido no se lee en ningún otro caso.
+    """
     doc = DocumentoInstrucciones.query.get(documento_id)
     if not doc:
         return jsonify({'error': 'Documento no encontrado'}), 404
 
-    ruta_archivo = resolver_ruta_documento(doc.archivo_url)
-    if ruta_archivo:
-        return send_file(ruta_archivo, mimetype='application/pdf')
+    download_name = f"{secure_filename(doc.nombre or 'instrucciones')}.pdf"
+    if doc.sha256:
+        ruta_archivo = ruta_en_disco(doc.sha256)
+        contenido = None if ruta_archivo else leer_contenido(doc.sha256)
+        etag = doc.sha256
+    else:
+        # Documento previo al almacén por hash sin respaldo en BD: solo existe en disco
+        ruta_archivo = resolver_ruta_documento(doc.archivo_url)
+        contenido = None
+        etag = True
 
-    if doc.archivo_blob:
-        return send_file(
-            io.BytesIO(doc.archivo_blob),
+    if ruta_archivo:
+        respuesta = send_file(
+            ruta_archivo,
             mimetype='application/pdf',
-            download_name=f"{secure_filename(doc.nombre or 'instrucciones')}.pdf"
+            download_name=download_name,
+            conditional=True,
+            etag=etag,
+            max_age=MAX_AGE_DOCUMENTOS
         )
-
-    return jsonify({'error': 'Archivo no encontrado'}), 404
+    elif contenido:
+        # Disco de solo lectura: se responde desde la BD (Range y 304 igual se respetan)
+        respuesta = send_file(
+            io.BytesIO(contenido),
+            mimetype='application/pdf',
+            download_name=download_name,
+            conditional=True,
+            etag=etag,
+            last_modified=doc.fecha_creacion,
+            max_age=MAX_AGE_DOCUMENTOS
+        )
+    else:
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+
+    # Los visores de PDF del celular piden por rangos solo si se anuncia
+    respuesta.headers['Accept-Ranges'] = 'bytes'
+    return respuesta
+
+
+def filtrar_pagos(consulta, desde=None, hasta=None):
+    """Aplica los filtros del listado de pagos a una consulta de reservas ⟕ pagos ⟕ domos"""
+    estado_pago = request.args.get('estado_pago')
+    if estado_pago and estado_pago != 'todos':
+        consulta = consulta.filter(db.func.coalesce(ReservaPago.estado_pago, 'pendiente') == estado_pago)
+    if request.args.get('instrucciones_pendientes') in ('1', 'true'):
+        consulta = consulta.filter(db.not_(db.func.coalesce(ReservaPago.instrucciones_enviadas, False)))
+    if desde:
+        consulta = consulta.filter(Reserva.fecha_fin >= desde)
+    if hasta:
+        consulta = consulta.filter(Reserva.fecha_inicio <= hasta)
+    busqueda = (request.args.get('q') or '').strip()
+    if busqueda:
+        patron = f'%{busqueda}%'
+        consulta = consulta.filter(db.or_(
+            Reserva.nombre_cliente.ilike(patron),
+            Reserva.email_cliente.ilike(patron),
+            Reserva.telefono_cliente.ilike(patron)
+        ))
+    return consulta
 
 
 @app.route('/api/admin/pagos', methods=['GET'])
 @admin_required
 def admin_pagos_listar():
-    reservas = Reserva.query.order_by(Reserva.fecha_inicio.desc()).all()
-    resultado = []
+    """Libro de pagos: una consulta para las filas y otra para los totales.
+
+    Filtros opcionales: estado_pago, instrucciones_pendientes=1, desde/hasta y q.
+    """
+    try:
+        desde, hasta = parsear_ventana()
+    except ValueError as e:
+        return jsonify({'error': f'Ventana de fechas inválida: {str(e)}'}), 400
+
+    filas = filtrar_pagos(
+        db.session.query(Reserva, ReservaPago, Domo.nombre)
+        .outerjoin(ReservaPago, ReservaPago.reserva_id == Reserva.id)
+        .outerjoin(Domo, Domo.id == Reserva.domo_id),
+        desde, hasta
+    ).order_by(Reserva.fecha_inicio.desc(), Reserva.id.desc()).all()
+
+    a_pagar, pagado = filtrar_pagos(
+        db.session.query(
+            db.func.coalesce(db.func.sum(ReservaPago.monto_a_pagar), 0),
+            db.func.coalesce(db.func.sum(ReservaPago.monto_pagado), 0)
+        ).select_from(Reserva).outerjoin(ReservaPago, ReservaPago.reserva_id == Reserva.id),
+        desde, hasta
+    ).one()
 
-    for reserva in reservas:
-        pago = ReservaPago.query.filter_by(reserva_id=reserva.id).first()
+    resultado = []
+    for reserva, pago, domo_nombre in filas:
         resultado.append({
             'reserva_id': reserva.id,
-            'domo_nombre': reserva.domo.nombre if reserva.domo else 'Domo',
+            'domo_nombre': domo_nombre or 'Domo',
             'nombre_cliente': reserva.nombre_cliente,
             'email_cliente': reserva.email_cliente,
             'telefono_cliente': reserva.telefono_cliente,
@@ -959,7 +1408,75 @@ def admin_pagos_listar():
             'instrucciones_enviadas': pago.instrucciones_enviadas if pago else False
         })
 
-    return jsonify(resultado), 200
+    return jsonify({
+        'pagos': resultado,
+        'totales': {
+            'monto_a_pagar': float(a_pagar),
+            'monto_pagado': float(pagado),
+            'pendiente': float(a_pagar) - float(pagado)
+        }
+    }), 200
+
+
+def responder_exportacion(nombre, encabezados, filas):
+    """Responde el export en CSV (streaming, por defecto) o XLSX según `formato`"""
+    fecha = datetime.now().strftime('%Y%m%d')
+    if request.args.get('formato') == 'xlsx':
+        try:
+            archivo = generar_xlsx(encabezados, filas, nombre)
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 501
+        return send_file(
+            archivo,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=f'{nombre}_{fecha}.xlsx'
+        )
+
+    return Response(
+        stream_with_context(generar_csv(encabezados, filas)),
+        mimetype='text/csv; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename="{nombre}_{fecha}.csv"'}
+    )
+
+
+@app.route('/api/admin/export/reservas')
+@admin_required
+def exportar_reservas():
+    """Exporta reservas con su domo y su pago. Acepta los mismos filtros que /api/admin/reservas"""
+    try:
+        desde, hasta = parsear_ventana()
+        fin_antes_str = request.args.get('fin_antes')
+        fin_antes = datetime.strptime(fin_antes_str, '%Y-%m-%d').date() if fin_antes_str else None
+        consulta = filtrar_reservas(
+            db.session.query(Reserva, ReservaPago, Domo.nombre)
+            .outerjoin(ReservaPago, ReservaPago.reserva_id == Reserva.id)
+            .outerjoin(Domo, Domo.id == Reserva.domo_id),
+            desde, hasta, fin_antes
+        ).order_by(Reserva.fecha_inicio.asc(), Reserva.id.asc())
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros inválidos: {str(e)}'}), 400
+
+    return responder_exportacion('reservas', ENCABEZADOS_RESERVAS, filas_reservas(consulta))
+
+
+@app.route('/api/admin/export/pagos')
+@admin_required
+def exportar_pagos():
+    """Exporta el libro de pagos. Acepta los mismos filtros que /api/admin/pagos"""
+    try:
+        desde, hasta = parsear_ventana()
+    except ValueError as e:
+        return jsonify({'error': f'Ventana de fechas inválida: {str(e)}'}), 400
+
+    consulta = filtrar_pagos(
+        db.session.query(Reserva, ReservaPago, Domo.nombre)
+        .outerjoin(ReservaPago, ReservaPago.reserva_id == Reserva.id)
+        .outerjoin(Domo, Domo.id == Reserva.domo_id),
+        desde, hasta
+    ).order_by(Reserva.fecha_inicio.asc(), Reserva.id.asc())
+
+    return responder_exportacion('pagos', ENCABEZADOS_PAGOS, filas_pagos(consulta))
 
 
 @app.route('/api/admin/pagos/<int:reserva_id>', methods=['PUT'])
@@ -996,6 +1513,16 @@ def admin_pagos_actualizar(reserva_id):
         return jsonify({'error': str(e)}), 500
 
 
+def url_pdf_instrucciones():
+    """URL pública del PDF de instrucciones activo (o el más reciente); None si no hay ninguno"""
+    documento = DocumentoInstrucciones.query.filter_by(activo=True).first()
+    if not documento:
+        documento = DocumentoInstrucciones.query.order_by(DocumentoInstrucciones.fecha_creacion.desc()).first()
+    if not documento:
+        return None
+    base_url = request.host_url.rstrip('/')
+    return f"{base_url}/api/documentos-instrucciones/{documento.id}/archivo"
+
 @app.route('/api/admin/instrucciones/enviar/<int:reserva_id>', methods=['POST'])
 @admin_required
 def admin_enviar_instrucciones(reserva_id):
@@ -1007,15 +1534,10 @@ def admin_enviar_instrucciones(reserva_id):
     canal = (data.get('canal') or 'whatsapp').strip().lower()
     mensaje_extra = (data.get('mensaje') or '').strip()
 
-    documento = DocumentoInstrucciones.query.filter_by(activo=True).first()
-    if not documento:
-        documento = DocumentoInstrucciones.query.order_by(DocumentoInstrucciones.fecha_creacion.desc()).first()
-    if not documento:
+    pdf_url = url_pdf_instrucciones()
+    if not pdf_url:
         return jsonify({'error': 'No hay PDFs de instrucciones cargados'}), 400
 
-    base_url = request.host_url.rstrip('/')
-    pdf_url = f"{base_url}/api/documentos-instrucciones/{documento.id}/archivo"
-
     mensaje_whatsapp = (
         f"Hola {reserva.nombre_cliente}!\n"
         f"Te compartimos las instrucciones de ingreso para tu estadía en {reserva.domo.nombre if reserva.domo else 'el domo'}.\n"
@@ -1045,6 +1567,77 @@ def admin_enviar_instrucciones(reserva_id):
     whatsapp_url = f"https://wa.me/{telefono}?text={quote_plus(mensaje_whatsapp)}"
     return jsonify({'canal': 'whatsapp', 'url': whatsapp_url}), 200
 
+MAX_DIAS_LOTE = 60
+# Un lote sin terminar más viejo que esto se da por abandonado (worker reiniciado)
+VIGENCIA_LOTE = timedelta(hours=1)
+
+@app.route('/api/admin/instrucciones/enviar-lote', methods=['POST'])
+@admin_required
+def admin_enviar_instrucciones_lote():
+    """Encola por email las instrucciones de las llegadas de los próximos `dias` días que no las recibieron.
+
+    Responde 202 con el lote; el avance se consulta en /api/admin/instrucciones/lotes/<id>.
+    """
+    if not smtp_configurado(app.config):
+        return jsonify({'error': 'El envío por email no está configurado (SMTP_HOST / SMTP_REMITENTE)'}), 503
+
+    data = request.json or {}
+    try:
+        dias = int(data.get('dias') or 7)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'dias debe ser un número'}), 400
+    if not 1 <= dias <= MAX_DIAS_LOTE:
+        return jsonify({'error': f'dias debe estar entre 1 y {MAX_DIAS_LOTE}'}), 400
+    mensaje_extra = (data.get('mensaje') or '').strip()
+
+    pdf_url = url_pdf_instrucciones()
+    if not pdf_url:
+        return jsonify({'error': 'No hay PDFs de instrucciones cargados'}), 400
+
+    en_curso = LoteEnvio.query.filter(
+        LoteEnvio.fecha_fin.is_(None),
+        LoteEnvio.fecha_creacion >= datetime.utcnow() - VIGENCIA_LOTE
+    ).first()
+    if en_curso:
+        return jsonify({'error': 'Ya hay un envío en curso', 'lote': en_curso.to_dict()}), 409
+
+    hoy = datetime.utcnow().date()
+    filas = db.session.query(Reserva.id, Reserva.nombre_cliente, Reserva.email_cliente, Domo.nombre) \
+        .outerjoin(Domo, Domo.id == Reserva.domo_id) \
+        .outerjoin(ReservaPago, ReservaPago.reserva_id == Reserva.id) \
+        .filter(
+            Reserva.estado == 'confirmada',
+            Reserva.fecha_inicio >= hoy,
+            Reserva.fecha_inicio <= hoy + timedelta(days=dias),
+            db.or_(ReservaPago.instrucciones_enviadas.is_(None), ReservaPago.instrucciones_enviadas.is_(False))
+        ).order_by(Reserva.fecha_inicio.asc(), Reserva.id.asc()).all()
+    destinatarios = [
+        {'reserva_id': reserva_id, 'nombre': nombre, 'email': email.strip(), 'domo': domo}
+        for reserva_id, nombre, email, domo in filas if email and email.strip()
+    ]
+
+    try:
+        lote = LoteEnvio(dias=dias, total=len(destinatarios), sin_email=len(filas) - len(destinatarios))
+        if not destinatarios:
+            lote.fecha_fin = datetime.utcnow()
+        db.session.add(lote)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+    encolar_lote(app, lote.id, destinatarios, pdf_url, mensaje_extra)
+    return jsonify({'mensaje': 'Envío encolado', 'lote': lote.to_dict()}), 202
+
+@app.route('/api/admin/instrucciones/lotes/<int:lote_id>', methods=['GET'])
+@admin_required
+def admin_lote_envio(lote_id):
+    """Avance de un envío masivo"""
+    lote = db.session.get(LoteEnvio, lote_id)
+    if not lote:
+        return jsonify({'error': 'Lote no encontrado'}), 404
+    return jsonify(lote.to_dict()), 200
+
 @app.route('/api/admin/feriados', methods=['GET', 'POST'])
 @admin_required
 def gestionar_feriados():
@@ -1062,7 +1655,9 @@ def gestionar_feriados():
         
         feriado = Feriado(fecha=fecha, nombre=data['nombre'])
         db.session.add(feriado)
+        incrementar_version_precios()
         db.session.commit()
+        invalidar_reglas()
         
         return jsonify({'mensaje': 'Feriado agregado', 'feriado': feriado.to_dict()}), 201
 
@@ -1076,22 +1671,32 @@ def eliminar_feriado(feriado_id):
         return jsonify({'error': 'Feriado no encontrado'}), 404
     
     db.session.delete(feriado)
+    incrementar_version_precios()
     db.session.commit()
+    invalidar_reglas()
     
     return jsonify({'mensaje': 'Feriado eliminado'}), 200
 
 @app.route('/api/admin/descuentos', methods=['GET', 'PUT'])
 @admin_required
 def gestionar_descuentos():
-    """Gestiona los descuentos por cantidad de días"""
+    """Gestiona los descuentos por cantidad de días.
+
+    Formato: {"3": 10, "7": 15} (noches mínimas → porcentaje 0-100). Sin nada
+    guardado rigen los descuentos por defecto; guardar {} los desactiva.
+    """
     if request.method == 'GET':
         config = Configuracion.query.filter_by(clave='descuentos').first()
         if config:
             return jsonify(json.loads(config.valor)), 200
-        return jsonify({}), 200
+        return jsonify({str(noches): round(fraccion * 100, 2) for noches, fraccion in DESCUENTOS_DEFECTO}), 200
     
     if request.method == 'PUT':
         data = request.json
+        try:
+            validar_descuentos(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         config = Configuracion.query.filter_by(clave='descuentos').first()
         
         if not config:
@@ -1100,10 +1705,11 @@ def gestionar_descuentos():
         else:
             config.valor = json.dumps(data)
         
+        incrementar_version_precios()
         db.session.commit()
+        invalidar_reglas()
         return jsonify({'mensaje': 'Descuentos actualizados'}), 200
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
+    preparar_worker()
     app.run(debug=True, port=5000)
@@ -0,0 +1,65 @@
+"""Benchmark de arranque de un worker.
+
+Mide, en procesos nuevos contra la base de DATABASE_URL (ya migrada):
+  - tiempo y sentencias SQL de `import app`
+  - latencia de la primera cotización sin calentar y después de preparar_worker()
+
+Uso: DATABASE_URL=... python benchmarks/arranque.py [repeticiones]
+"""
+import json
+import os
+import subprocess
+import sys
+import statistics
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEDICION = r'''
+import json, sys, time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+sentencias = []
+event.listen(Engine, 'before_cursor_execute', lambda *a: sentencias.append(a[2]))
+
+t0 = time.perf_counter()
+import app as m
+importar = time.perf_counter() - t0
+sql_import = len(sentencias)
+
+preparar = 0.0
+if sys.argv[1] == 'calentado':
+    t0 = time.perf_counter()
+    m.preparar_worker()
+    preparar = time.perf_counter() - t0
+
+cliente = m.app.test_client()
+cuerpo = {'domo_id': 1, 'fecha_inicio': '2027-03-01', 'fecha_fin': '2027-03-05'}
+t0 = time.perf_counter()
+respuesta = cliente.post('/api/calcular-precio', json=cuerpo)
+primera = time.perf_counter() - t0
+assert respuesta.status_code == 200, respuesta.get_data()
+print(json.dumps({'importar': importar, 'sql_import': sql_import, 'preparar': preparar, 'primera': primera}))
+'''
+
+
+def medir(modo):
+    salida = subprocess.run(
+        [sys.executable, '-c', MEDICION, modo],
+        cwd=RAIZ, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for modo in ('sin_calentar', 'calentado'):
+        muestras = [medir(modo) for _ in range(repeticiones)]
+        mediana = {clave: statistics.median(m[clave] for m in muestras) for clave in muestras[0]}
+        print(
+            f"{modo:13s} import {mediana['importar'] * 1000:7.1f} ms ({mediana['sql_import']:.0f} SQL)  "
+            f"preparar {mediana['preparar'] * 1000:7.1f} ms  primera cotización {mediana['primera'] * 1000:7.1f} ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark de la compresión de respuestas.
+
+Pide las rutas JSON más pesadas con `Accept-Encoding: identity` (como antes
+de comprimir), `gzip` y `br`, y compara bytes enviados, tiempo en el servidor
+y tiempo total estimado para un enlace de `--mbps` megabits por segundo.
+
+Corre en proceso con el cliente de pruebas de Flask contra la base de
+DATABASE_URL (ya migrada). `--sembrar N` agrega N reservas de prueba
+repartidas entre los domos: usar solo con una base descartable.
+
+Uso:
+  DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/compresion.py \\
+      [--sembrar 3000] [--repeticiones 20] [--mbps 10]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+RUTAS = [
+    '/api/admin/reservas?limite=500',
+    '/api/admin/pagos',
+    '/api/disponibilidad/1?desde=2000-01-01&hasta=2100-01-01',
+    '/api/disponibilidad?desde=2000-01-01&hasta=2100-01-01',
+]
+CODIFICACIONES = ('identity', 'gzip', 'br')
+
+
+def sembrar(cantidad):
+    from models import db, Domo, Reserva
+    domos = [d.id for d in Domo.query.order_by(Domo.id).all()]
+    inicio = date(2020, 1, 1)
+    for i in range(cantidad):
+        # Estadías de 2 noches, sin superposición dentro de cada domo
+        fecha_inicio = inicio + timedelta(days=3 * (i // len(domos)))
+        db.session.add(Reserva(
+            domo_id=domos[i % len(domos)],
+            nombre_cliente=f'Cliente de prueba {i}',
+            email_cliente=f'cliente{i}@ejemplo.com',
+            telefono_cliente=f'+54 9 11 5555-{i % 10000:04d}',
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_inicio + timedelta(days=2),
+            estado='confirmada'
+        ))
+    db.session.commit()
+
+
+def medir(cliente, ruta, codificacion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        respuesta = cliente.get(ruta, headers={'Accept-Encoding': codificacion})
+        datos = respuesta.get_data()
+        tiempos.append(time.perf_counter() - inicio)
+        assert respuesta.status_code == 200, (ruta, respuesta.status_code)
+    return len(datos), statistics.median(tiempos), respuesta.headers.get('Content-Encoding') or 'identity'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sembrar', type=int, default=0)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--mbps', type=float, default=10)
+    args = parser.parse_args()
+
+    import app as m
+    m.preparar_worker()
+    with m.app.app_context():
+        if args.sembrar:
+            sembrar(args.sembrar)
+
+    cliente = m.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['admin_logged_in'] = True
+
+    bytes_por_segundo = args.mbps * 1_000_000 / 8
+    print(f"umbral {m.app.config['COMPRESION_UMBRAL_BYTES']} B, enlace {args.mbps:g} Mbit/s, mediana de {args.repeticiones}")
+    for ruta in RUTAS:
+        print(ruta)
+        base = None
+        for codificacion in CODIFICACIONES:
+            tamanio, servidor, usada = medir(cliente, ruta, codificacion, args.repeticiones)
+            total = servidor + tamanio / bytes_por_segundo
+            base = base or (tamanio, total)
+            print(
+                f"  {codificacion:8s} ({usada:8s}) {tamanio:9d} B  {tamanio / base[0]:6.1%}  "
+                f"servidor {servidor * 1000:7.2f} ms  total estimado {total * 1000:8.2f} ms "
+                f"({total / base[1]:6.1%})"
+            )
+
+
+if __name__ == '__main__':
+    main()
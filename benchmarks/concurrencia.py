@@ -0,0 +1,158 @@
+"""Prueba de concurrencia de crear_reserva.
+
+Levanta gunicorn (varios workers, como en producción) contra la base de
+DATABASE_URL y, con todos los clientes liberados a la vez por una barrera:
+
+  1. `--clientes` pedidos reservan el mismo rango del mismo domo: debe ganar
+     exactamente uno y el resto recibir 409 (ningún 500).
+  2. Al mismo tiempo, otros clientes reservan rangos distintos en los demás
+     domos: todos deben ganar, y se compara su latencia con la de una corrida
+     igual sin la carrera sobre el primer domo.
+
+Termina con código 1 si falla alguna de las dos condiciones. Crea reservas de
+verdad en fechas lejanas (`--anio`): usar con una base descartable.
+
+Uso:
+  DATABASE_URL=sqlite:////tmp/concurrencia.db flask --app app db-upgrade
+  DATABASE_URL=sqlite:////tmp/concurrencia.db python benchmarks/concurrencia.py \\
+      [--clientes 40] [--workers 4] [--anio 2090]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PUERTO = 8798
+
+
+def esperar_listo(base, limite=30):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            with urllib.request.urlopen(f'{base}/readyz', timeout=2) as respuesta:
+                if respuesta.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn no quedó listo')
+
+
+def reservar(base, domo_id, fecha_inicio, noches, cliente):
+    cuerpo = json.dumps({
+        'domo_id': domo_id,
+        'fecha_inicio': fecha_inicio.isoformat(),
+        'fecha_fin': (fecha_inicio + timedelta(days=noches)).isoformat(),
+        'nombre_cliente': f'Concurrencia {cliente}',
+        'telefono_cliente': '0000000000'
+    }).encode('utf-8')
+    pedido = urllib.request.Request(
+        f'{base}/api/crear-reserva', data=cuerpo, headers={'Content-Type': 'application/json'}
+    )
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(pedido, timeout=30) as respuesta:
+            status = respuesta.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - inicio
+
+
+def disparar(trabajos):
+    """Corre cada trabajo en su hilo, todos liberados juntos. Devuelve sus resultados en orden"""
+    barrera = threading.Barrier(len(trabajos))
+    resultados = [None] * len(trabajos)
+
+    def correr(i, trabajo):
+        barrera.wait()
+        resultados[i] = trabajo()
+
+    hilos = [threading.Thread(target=correr, args=(i, t)) for i, t in enumerate(trabajos)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resultados
+
+
+def trabajos_otros_domos(base, otros, clientes, desde):
+    # Una estadía de 2 noches por cliente, sin superposición dentro de cada domo
+    return [
+        (lambda i=i: reservar(base, otros[i % len(otros)], desde + timedelta(days=3 * (i // len(otros))), 2, f'otro-{i}'))
+        for i in range(clientes)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clientes', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--anio', type=int, default=2090)
+    args = parser.parse_args()
+
+    entorno = dict(os.environ, WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads))
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{PUERTO}', 'app:app'],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f'http://127.0.0.1:{PUERTO}'
+    try:
+        esperar_listo(base)
+        with urllib.request.urlopen(f'{base}/api/domos', timeout=10) as respuesta:
+            domos = [d['id'] for d in json.load(respuesta)]
+        if len(domos) < 2:
+            raise RuntimeError('Hacen falta al menos dos domos')
+        disputado, otros = domos[0], domos[1:]
+
+        # Referencia: solo la carga sobre los otros domos
+        referencia = disparar(trabajos_otros_domos(base, otros, args.clientes, date(args.anio, 1, 1)))
+
+        # Carrera sobre un domo mientras los otros reciben la misma carga en fechas nuevas
+        fecha_disputada = date(args.anio, 6, 1)
+        carrera = [
+            (lambda i=i: reservar(base, disputado, fecha_disputada, 3, f'carrera-{i}'))
+            for i in range(args.clientes)
+        ]
+        resultados = disparar(carrera + trabajos_otros_domos(base, otros, args.clientes, date(args.anio, 7, 1)))
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+    en_carrera = resultados[:args.clientes]
+    en_paralelo = resultados[args.clientes:]
+    ganadores = sum(1 for status, _ in en_carrera if status == 201)
+    rechazados = sum(1 for status, _ in en_carrera if status == 409)
+    otros_ok = sum(1 for status, _ in en_paralelo if status == 201)
+    referencia_ok = sum(1 for status, _ in referencia if status == 201)
+
+    def mediana_ms(filas):
+        return statistics.median(duracion for _, duracion in filas) * 1000
+
+    print(f"{args.workers} workers x {args.threads} hilos, {args.clientes} clientes por grupo")
+    print(f"domo {disputado}: {ganadores} ganó, {rechazados} con 409, {args.clientes - ganadores - rechazados} con otro estado")
+    print(f"otros domos sin carrera: {referencia_ok}/{args.clientes} ok, mediana {mediana_ms(referencia):.1f} ms")
+    print(f"otros domos con carrera: {otros_ok}/{args.clientes} ok, mediana {mediana_ms(en_paralelo):.1f} ms")
+
+    fallas = []
+    if ganadores != 1 or rechazados != args.clientes - 1:
+        fallas.append('la carrera sobre un domo debe tener exactamente un ganador y el resto 409')
+    if otros_ok != args.clientes or referencia_ok != args.clientes:
+        fallas.append('todas las reservas en otros domos deben ganar')
+    for falla in fallas:
+        print(f"✗ {falla}")
+    if fallas:
+        sys.exit(1)
+    print("✓ Sin doble reserva y sin bloquear a los otros domos")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark de throughput según el tamaño del pool de conexiones.
+
+Levanta gunicorn con el perfil de producción para cada DB_POOL_SIZE pedido y
+le envía carga concurrente a rutas públicas que consultan la base. Pensado
+para una PostgreSQL local ya migrada (`flask --app app db-upgrade`).
+
+Uso:
+  DATABASE_URL=postgresql://... python benchmarks/pool.py [--pools 1,2,4,8] \\
+      [--workers 2] [--threads 8] [--clientes 32] [--segundos 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PUERTO = 8799
+RUTAS = [
+    '/api/disponibilidad/1?formato=rangos',
+    '/api/disponibilidad',
+    '/api/domos',
+    '/api/promociones',
+]
+
+
+def esperar_listo(base, limite=30):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            with urllib.request.urlopen(f'{base}/readyz', timeout=2) as respuesta:
+                if respuesta.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn no quedó listo')
+
+
+def cargar(base, clientes, segundos):
+    latencias = []
+    errores = [0]
+    lock = threading.Lock()
+    fin = time.monotonic() + segundos
+
+    def cliente(indice):
+        i = indice
+        while time.monotonic() < fin:
+            ruta = RUTAS[i % len(RUTAS)]
+            i += 1
+            inicio = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base + ruta, timeout=10) as respuesta:
+                    respuesta.read()
+                duracion = time.perf_counter() - inicio
+                with lock:
+                    latencias.append(duracion)
+            except OSError:
+                with lock:
+                    errores[0] += 1
+
+    with ThreadPoolExecutor(max_workers=clientes) as ejecutor:
+        list(ejecutor.map(cliente, range(clientes)))
+    return latencias, errores[0]
+
+
+def medir(pool, args):
+    entorno = dict(
+        os.environ,
+        APP_PERFIL='produccion',
+        DB_POOL_SIZE=str(pool),
+        DB_MAX_OVERFLOW='0',
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+    )
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{PUERTO}', 'app:app'],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f'http://127.0.0.1:{PUERTO}'
+    try:
+        esperar_listo(base)
+        latencias, errores = cargar(base, args.clientes, args.segundos)
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+    latencias.sort()
+    p95 = latencias[int(len(latencias) * 0.95)] if latencias else 0
+    print(
+        f"pool {pool:3d}  {len(latencias) / args.segundos:8.1f} req/s  "
+        f"mediana {statistics.median(latencias) * 1000 if latencias else 0:7.1f} ms  "
+        f"p95 {p95 * 1000:7.1f} ms  errores {errores}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pools', default='1,2,4,8')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--clientes', type=int, default=32)
+    parser.add_argument('--segundos', type=float, default=10)
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL', '').startswith('postgres'):
+        print('Aviso: el perfil de pool solo se aplica con PostgreSQL; con otra base se mide el pool por defecto')
+    print(f"{args.workers} workers x {args.threads} hilos, {args.clientes} clientes, {args.segundos:.0f} s por medición")
+    for pool in (int(p) for p in args.pools.split(',')):
+        medir(pool, args)
+
+
+if __name__ == '__main__':
+    main()
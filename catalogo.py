@@ -0,0 +1,97 @@
+"""Caché en memoria de las respuestas públicas del catálogo (domos, galería, promociones).
+
+Cada worker guarda el JSON ya serializado de cada lista junto con su ETag (hash
+del contenido). Las rutas de admin que modifican domos, fotos o promociones
+incrementan la versión en `configuracion`; los workers la verifican cada
+VERIFICAR_VERSION_SEGUNDOS y descartan su copia si cambió, igual que las
+reglas de precios. En régimen estable una visita a la portada no consulta la BD.
+"""
+import hashlib
+import threading
+import time
+
+from flask import current_app
+from jinja2.utils import htmlsafe_json_dumps
+
+from versiones import leer_version, incrementar_version
+
+CLAVE_VERSION = 'version_catalogo'
+VERIFICAR_VERSION_SEGUNDOS = 5
+
+# Listas que la portada recibe embebidas en el HTML
+LISTAS_BOOTSTRAP = ('domos', 'galeria', 'promociones')
+
+_constructores = {}
+_entradas = {}
+_bootstrap = None
+_version = None
+_verificado = 0.0
+_lock = threading.Lock()
+
+
+class EntradaCatalogo:
+    """Lista del catálogo lista para responder: datos, JSON serializado y ETag"""
+
+    def __init__(self, datos, cuerpo):
+        self.datos = datos
+        self.cuerpo = cuerpo
+        self.etag = hashlib.sha256(cuerpo).hexdigest()[:32]
+
+
+def registrar_catalogo(nombre):
+    """Decorador: registra la función que arma la lista `nombre` desde la BD"""
+    def decorador(constructor):
+        _constructores[nombre] = constructor
+        return constructor
+    return decorador
+
+
+def _verificar_version():
+    global _version, _verificado, _bootstrap
+    if time.monotonic() - _verificado < VERIFICAR_VERSION_SEGUNDOS:
+        return
+    version = leer_version(CLAVE_VERSION)
+    with _lock:
+        if version != _version:
+            _entradas.clear()
+            _bootstrap = None
+            _version = version
+        _verificado = time.monotonic()
+
+
+def obtener_catalogo(nombre):
+    """Devuelve la EntradaCatalogo vigente de `nombre`, armándola si hace falta"""
+    _verificar_version()
+    entrada = _entradas.get(nombre)
+    if entrada is None:
+        datos = _constructores[nombre]()
+        entrada = EntradaCatalogo(datos, current_app.json.dumps(datos).encode('utf-8'))
+        with _lock:
+            _entradas[nombre] = entrada
+    return entrada
+
+
+def obtener_bootstrap():
+    """JSON con las listas de LISTAS_BOOTSTRAP, escapado para embeberlo en un <script>"""
+    global _bootstrap
+    datos = {nombre: obtener_catalogo(nombre).datos for nombre in LISTAS_BOOTSTRAP}
+    bootstrap = _bootstrap
+    if bootstrap is None:
+        bootstrap = htmlsafe_json_dumps(datos, dumps=current_app.json.dumps)
+        with _lock:
+            _bootstrap = bootstrap
+    return bootstrap
+
+
+def incrementar_version_catalogo():
+    """Incrementa la versión del catálogo en la sesión actual (el llamador hace commit)"""
+    incrementar_version(CLAVE_VERSION)
+
+
+def invalidar_catalogo():
+    """Descarta la copia local para que la próxima petición la rearme"""
+    global _bootstrap, _verificado
+    with _lock:
+        _entradas.clear()
+        _bootstrap = None
+        _verificado = 0.0
@@ -0,0 +1,71 @@
+"""Compresión de respuestas según Accept-Encoding.
+
+Se aplica en un `after_request` a toda la app: comprime con br (si Brotli está
+instalado) o gzip las respuestas de texto/JSON que superen el umbral. Quedan
+afuera las que ya vienen comprimidas (activos precomprimidos, PDFs,
+imágenes), las que se envían con send_file (`direct_passthrough`) y las que
+se transmiten por partes (exportaciones CSV), para no cargarlas enteras.
+
+Los niveles son moderados a propósito: la compresión se hace en cada
+petición, y br 5 / gzip 6 rinden casi lo mismo que el máximo por mucho menos
+CPU.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # Brotli es opcional
+    brotli = None
+
+TIPOS_COMPRIMIBLES = {
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'text/html',
+    'text/css',
+    'text/csv',
+    'text/plain',
+    'image/svg+xml',
+}
+
+
+def _codificacion_aceptada(codificaciones_aceptadas):
+    if brotli is not None and codificaciones_aceptadas['br']:
+        return 'br'
+    if codificaciones_aceptadas['gzip']:
+        return 'gzip'
+    return None
+
+
+def comprimir_respuesta(respuesta, codificaciones_aceptadas, umbral, nivel_gzip=6, calidad_brotli=5):
+    """Comprime en el lugar el cuerpo de `respuesta` si corresponde. Devuelve la respuesta"""
+    if (
+        respuesta.status_code != 200
+        or respuesta.direct_passthrough
+        or respuesta.is_streamed
+        or 'Content-Encoding' in respuesta.headers
+        or respuesta.mimetype not in TIPOS_COMPRIMIBLES
+    ):
+        return respuesta
+
+    # La representación depende del encabezado aunque esta vez no se comprima
+    respuesta.vary.add('Accept-Encoding')
+    codificacion = _codificacion_aceptada(codificaciones_aceptadas)
+    if codificacion is None:
+        return respuesta
+    cuerpo = respuesta.get_data()
+    if len(cuerpo) < umbral:
+        return respuesta
+
+    if codificacion == 'br':
+        comprimido = brotli.compress(cuerpo, mode=brotli.MODE_TEXT, quality=calidad_brotli)
+    else:
+        comprimido = gzip.compress(cuerpo, compresslevel=nivel_gzip)
+    respuesta.set_data(comprimido)
+    respuesta.headers['Content-Encoding'] = codificacion
+
+    # Mismo contenido, otros bytes: el ETag pasa a débil (los 304 siguen funcionando)
+    etag, debil = respuesta.get_etag()
+    if etag and not debil:
+        respuesta.set_etag(etag, weak=True)
+    return respuesta
@@ -1,6 +1,46 @@
 import os
 from datetime import datetime
 
+
+def _entero(nombre, defecto):
+    return int(os.environ.get(nombre, defecto))
+
+
+def opciones_engine(database_url):
+    """Opciones del pool de SQLAlchemy según el perfil (APP_PERFIL=produccion).
+
+    Cada worker de gunicorn tiene su propio pool: con W workers, las conexiones
+    a PostgreSQL llegan a W * (DB_POOL_SIZE + DB_MAX_OVERFLOW). El pool por
+    defecto iguala la cantidad de hilos del worker (GUNICORN_THREADS).
+    """
+    if os.environ.get('APP_PERFIL') != 'produccion' or not database_url.startswith('postgresql'):
+        return {}
+
+    aplicacion = os.environ.get('DB_APPLICATION_NAME', 'gestion_reservas_domos')
+    if os.environ.get('DB_PGBOUNCER') == '1':
+        # PgBouncer en modo transacción ya agrupa conexiones: sin pool local ni
+        # parámetros de arranque que no reenvía (statement_timeout va en el rol:
+        # ALTER ROLE ... SET statement_timeout)
+        from sqlalchemy.pool import NullPool
+        return {
+            'poolclass': NullPool,
+            'connect_args': {'application_name': aplicacion}
+        }
+
+    return {
+        'pool_size': _entero('DB_POOL_SIZE', _entero('GUNICORN_THREADS', 4)),
+        'max_overflow': _entero('DB_MAX_OVERFLOW', 2),
+        'pool_timeout': _entero('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': _entero('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+        'connect_args': {
+            'application_name': aplicacion,
+            'connect_timeout': _entero('DB_CONNECT_TIMEOUT', 5),
+            'options': f"-c statement_timeout={_entero('DB_STATEMENT_TIMEOUT_MS', 15000)}"
+        }
+    }
+
+
 class Config:
     """Configuración general de la aplicación"""
     SECRET_KEY = 'domos2025_secret_key'
@@ -15,8 +55,33 @@ class Config:
     if _database_url.startswith('postgresql://'):
         _database_url = _database_url.replace('postgresql://', 'postgresql+psycopg2://', 1)
     SQLALCHEMY_DATABASE_URI = _database_url
+    SQLALCHEMY_ENGINE_OPTIONS = opciones_engine(_database_url)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     ADMIN_PASSWORD = 'domos2025'
+
+    # Subidas: tope por petición (Flask responde 413) y por tipo de archivo
+    MAX_CONTENT_LENGTH = 21 * 1024 * 1024
+    LIMITE_SUBIDA_IMAGEN = 8 * 1024 * 1024
+    LIMITE_SUBIDA_PDF = 20 * 1024 * 1024
+
+    # Espejo local de imágenes externas (ver espejo.py)
+    HOSTS_ESPEJO_IMAGENES = set(filter(None, os.environ.get('HOSTS_ESPEJO_IMAGENES', 'i.imgur.com').split(',')))
+    LIMITE_ESPEJO_IMAGENES = 200 * 1024 * 1024
+    REVALIDAR_ESPEJO_SEGUNDOS = 7 * 24 * 3600
+
+    # Compresión de respuestas (ver compresion.py); 0 la desactiva
+    COMPRESION_UMBRAL_BYTES = _entero('COMPRESION_UMBRAL_BYTES', 1024)
+    COMPRESION_NIVEL_GZIP = 6
+    COMPRESION_CALIDAD_BROTLI = 5
+
+    # Envío de instrucciones por email (ver envios.py); sin SMTP_HOST queda desactivado
+    SMTP_HOST = os.environ.get('SMTP_HOST')
+    SMTP_PORT = _entero('SMTP_PORT', 587)
+    SMTP_USUARIO = os.environ.get('SMTP_USUARIO')
+    SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+    SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1') == '1'
+    SMTP_REMITENTE = os.environ.get('SMTP_REMITENTE') or os.environ.get('SMTP_USUARIO')
+    ENVIO_HILOS = _entero('ENVIO_HILOS', 2)
     
     # Configuración de precios por defecto
     PRECIOS_DEFAULT = {
@@ -0,0 +1,60 @@
+"""Consultas de disponibilidad sobre las reservas confirmadas.
+
+La verificación de una reserva nueva no pasa por acá sino por el mapa de
+ocupación persistente (`ocupacion.rango_ocupado`, con el domo bloqueado): es
+la única fuente que ven igual todos los workers. Este módulo arma las vistas
+de lectura (calendarios, sugerencias) con consultas acotadas a la ventana
+pedida.
+"""
+from itertools import accumulate
+
+from models import db, Reserva
+
+
+def _consulta_ventana(desde, hasta):
+    consulta = db.session.query(Reserva.domo_id, Reserva.fecha_inicio, Reserva.fecha_fin).filter(
+        Reserva.estado == 'confirmada'
+    )
+    if desde is not None:
+        consulta = consulta.filter(Reserva.fecha_fin >= desde)
+    if hasta is not None:
+        consulta = consulta.filter(Reserva.fecha_inicio <= hasta)
+    return consulta
+
+
+def reservas_en_ventana(domo_id, desde=None, hasta=None):
+    """Lista de (fecha_inicio, fecha_fin) confirmadas del domo que tocan la ventana.
+
+    Consulta directa a la BD para que el calendario refleje también lo
+    reservado en otros workers. Se incluyen las reservas que salen
+    justo en `desde` o entran justo en `hasta` para marcar checkouts y entradas.
+    """
+    consulta = _consulta_ventana(desde, hasta).filter(Reserva.domo_id == domo_id)
+    return [(f.fecha_inicio, f.fecha_fin) for f in consulta.order_by(Reserva.fecha_inicio).all()]
+
+
+def reservas_en_ventana_por_domo(domo_ids, desde=None, hasta=None):
+    """Como reservas_en_ventana pero para varios domos en una sola consulta.
+
+    Devuelve {domo_id: [(fecha_inicio, fecha_fin), ...]} con una entrada
+    (posiblemente vacía) por cada domo pedido.
+    """
+    resultado = {domo_id: [] for domo_id in domo_ids}
+    if not resultado:
+        return resultado
+    consulta = _consulta_ventana(desde, hasta).filter(Reserva.domo_id.in_(resultado.keys()))
+    for fila in consulta.order_by(Reserva.domo_id, Reserva.fecha_inicio).all():
+        resultado[fila.domo_id].append((fila.fecha_inicio, fila.fecha_fin))
+    return resultado
+
+
+def inicios_libres(ocupacion, dias, noches):
+    """Desplazamientos en los que entran `noches` noches seguidas libres.
+
+    `ocupacion` tiene una posición por noche (1 = ocupada) que cubre los `dias`
+    candidatos más las noches de la estadía; con sus sumas acumuladas cada
+    candidato se evalúa en O(1) en lugar de consultar rango por rango.
+    """
+    acumulados = [0] + list(accumulate(ocupacion))
+    return [i for i in range(dias) if acumulados[i + noches] == acumulados[i]]
+
@@ -0,0 +1,91 @@
+"""Almacén de PDFs direccionado por contenido.
+
+Cada PDF se identifica por su SHA-256: el contenido se guarda una sola vez en
+`archivos_documentos` (respaldo para hosts efímeros como Railway) y en disco
+como `<sha256>.pdf` dentro de DOCS_FOLDER, que funciona como caché. Subir dos
+veces el mismo archivo no duplica bytes, y los listados nunca leen el
+contenido (columna diferida).
+
+Si el disco perdió la caché (nuevo deploy), el archivo se repone desde la BD
+la primera vez que alguien lo pide; las siguientes peticiones lo sirven
+directo del disco.
+"""
+import os
+import uuid
+
+from flask import current_app
+
+from models import db, ArchivoDocumento, DocumentoInstrucciones
+
+
+def ruta_cache(sha256):
+    return os.path.join(current_app.config['DOCS_FOLDER'], f'{sha256}.pdf')
+
+
+def url_documento(sha256):
+    return f'/static/docs/{sha256}.pdf'
+
+
+def _escribir_atomico(ruta, contenido):
+    """Escribe en un temporal y renombra, para no servir nunca un archivo a medias"""
+    temporal = f'{ruta}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+        return True
+    except OSError:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        return False
+
+
+def guardar_subida(subido):
+    """Incorpora un ArchivoSubido (ver subidas.py) al almacén; el llamador hace commit.
+
+    Si el hash ya existía no se leen los bytes: solo se descarta el temporal.
+    Devuelve (sha256, tamaño).
+    """
+    sha256 = subido.sha256
+    if db.session.get(ArchivoDocumento, sha256) is None:
+        db.session.add(ArchivoDocumento(sha256=sha256, tamanio=subido.tamanio, contenido=subido.leer()))
+        db.session.flush()
+    ruta = ruta_cache(sha256)
+    if os.path.exists(ruta):
+        subido.descartar()
+    else:
+        subido.mover(ruta)
+    return sha256, subido.tamanio
+
+
+def ruta_en_disco(sha256):
+    """Ruta del PDF en la caché de disco, reponiéndolo desde la BD si falta.
+
+    Devuelve None si el hash no existe o el disco no admite escritura.
+    """
+    ruta = ruta_cache(sha256)
+    if os.path.exists(ruta):
+        return ruta
+    archivo = db.session.get(ArchivoDocumento, sha256)
+    if archivo is None or not _escribir_atomico(ruta, archivo.contenido):
+        return None
+    return ruta
+
+
+def leer_contenido(sha256):
+    """Bytes del PDF desde la BD (solo para discos de solo lectura)"""
+    fila = db.session.query(ArchivoDocumento.contenido).filter(ArchivoDocumento.sha256 == sha256).first()
+    return fila.contenido if fila else None
+
+
+def liberar_contenido(sha256):
+    """Borra el contenido y su caché si ningún documento lo usa (el llamador hace commit)"""
+    if not sha256:
+        return
+    en_uso = db.session.query(DocumentoInstrucciones.id).filter(DocumentoInstrucciones.sha256 == sha256).first()
+    if en_uso:
+        return
+    db.session.query(ArchivoDocumento).filter(ArchivoDocumento.sha256 == sha256).delete(synchronize_session=False)
+    ruta = ruta_cache(sha256)
+    if os.path.exists(ruta):
+        os.remove(ruta)
@@ -0,0 +1,145 @@
+"""Envío masivo de instrucciones de ingreso por email.
+
+El admin pide "instrucciones a todas las llegadas de los próximos N días que
+todavía no las recibieron": la petición arma la lista, crea un `LoteEnvio` y
+vuelve enseguida. El envío lo hace un pool de hilos del worker, en tandas de
+TAMANIO_TANDA destinatarios por conexión SMTP; al terminar cada tanda se
+marcan juntas las reservas enviadas (`ReservaPago.instrucciones_enviadas`) y
+se suman los contadores del lote con UPDATE en la base, así el avance se ve
+desde cualquier worker.
+
+Si el proceso se reinicia a mitad de un lote, las reservas no enviadas quedan
+sin marcar y un lote nuevo las vuelve a tomar.
+"""
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+
+from models import db, LoteEnvio, ReservaPago
+
+TAMANIO_TANDA = 20
+TIMEOUT_SMTP = 20
+ASUNTO = 'Instrucciones de ingreso - Reserva de domo'
+
+_ejecutor = None
+_lock = threading.Lock()
+
+
+def smtp_configurado(config):
+    return bool(config.get('SMTP_HOST') and config.get('SMTP_REMITENTE'))
+
+
+def _ejecutor_envios(hilos):
+    global _ejecutor
+    with _lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='envios')
+        return _ejecutor
+
+
+def armar_mensaje(remitente, destinatario, pdf_url, mensaje_extra=''):
+    mensaje = EmailMessage()
+    mensaje['Subject'] = ASUNTO
+    mensaje['From'] = remitente
+    mensaje['To'] = destinatario['email']
+    cuerpo = (
+        f"Hola {destinatario['nombre']},\n\n"
+        f"Te compartimos las instrucciones de ingreso para tu estadía en {destinatario['domo'] or 'el domo'}:\n"
+        f"{pdf_url}\n\n"
+    )
+    if mensaje_extra:
+        cuerpo += f"{mensaje_extra}\n\n"
+    mensaje.set_content(cuerpo + 'Gracias.')
+    return mensaje
+
+
+def _conectar(config):
+    smtp = smtplib.SMTP(config['SMTP_HOST'], config['SMTP_PORT'], timeout=TIMEOUT_SMTP)
+    try:
+        if config['SMTP_STARTTLS']:
+            smtp.starttls()
+        if config.get('SMTP_USUARIO'):
+            smtp.login(config['SMTP_USUARIO'], config['SMTP_PASSWORD'] or '')
+    except Exception:
+        smtp.close()
+        raise
+    return smtp
+
+
+def marcar_enviadas(reserva_ids):
+    """Marca las instrucciones como enviadas, creando los pagos que falten (el llamador hace commit)"""
+    if not reserva_ids:
+        return
+    existentes = set(db.session.execute(
+        db.select(ReservaPago.reserva_id).where(ReservaPago.reserva_id.in_(reserva_ids))
+    ).scalars())
+    db.session.add_all(
+        ReservaPago(reserva_id=reserva_id, instrucciones_enviadas=True)
+        for reserva_id in reserva_ids if reserva_id not in existentes
+    )
+    ReservaPago.query.filter(ReservaPago.reserva_id.in_(existentes)).update(
+        {'instrucciones_enviadas': True}, synchronize_session=False
+    )
+
+
+def registrar_avance(lote_id, enviados, fallidos, error=None):
+    """Suma el resultado de una tanda al lote y lo cierra si no quedan pendientes (el llamador hace commit)"""
+    valores = {'enviados': LoteEnvio.enviados + enviados, 'fallidos': LoteEnvio.fallidos + fallidos}
+    if error:
+        valores['ultimo_error'] = error[:300]
+    db.session.execute(db.update(LoteEnvio).where(LoteEnvio.id == lote_id).values(**valores))
+    db.session.execute(
+        db.update(LoteEnvio)
+        .where(LoteEnvio.id == lote_id, LoteEnvio.fecha_fin.is_(None),
+               LoteEnvio.enviados + LoteEnvio.fallidos >= LoteEnvio.total)
+        .values(fecha_fin=datetime.utcnow())
+    )
+
+
+def _enviar_tanda(app, lote_id, destinatarios, pdf_url, mensaje_extra):
+    enviados = []
+    fallidos = 0
+    error = None
+    try:
+        smtp = _conectar(app.config)
+        try:
+            for destinatario in destinatarios:
+                try:
+                    smtp.send_message(armar_mensaje(app.config['SMTP_REMITENTE'], destinatario, pdf_url, mensaje_extra))
+                    enviados.append(destinatario['reserva_id'])
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                    # Rechazo de un destinatario: la conexión sigue sirviendo para el resto
+                    fallidos += 1
+                    error = f"{destinatario['email']}: {e}"
+        finally:
+            try:
+                smtp.quit()
+            except smtplib.SMTPException:
+                smtp.close()
+    except (smtplib.SMTPException, OSError) as e:
+        # Se cayó la conexión: lo que no salió cuenta como fallido
+        fallidos = len(destinatarios) - len(enviados)
+        error = str(e)
+
+    with app.app_context():
+        try:
+            marcar_enviadas(enviados)
+            registrar_avance(lote_id, len(enviados), fallidos, error)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error registrando el lote de envío {lote_id}: {e}")
+
+
+def encolar_lote(app, lote_id, destinatarios, pdf_url, mensaje_extra=''):
+    """Reparte los destinatarios en tandas y las encola; no bloquea la petición.
+
+    `destinatarios` son dicts {reserva_id, nombre, email, domo}.
+    """
+    ejecutor = _ejecutor_envios(app.config['ENVIO_HILOS'])
+    return [
+        ejecutor.submit(_enviar_tanda, app, lote_id, destinatarios[i:i + TAMANIO_TANDA], pdf_url, mensaje_extra)
+        for i in range(0, len(destinatarios), TAMANIO_TANDA)
+    ]
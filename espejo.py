@@ -0,0 +1,245 @@
+"""Espejo local de imágenes externas (la galería sembrada apunta a imgur).
+
+La primera vez que alguien pide una imagen remota se descarga por bloques a
+una carpeta en disco y desde ahí se sirve con nuestros encabezados de caché.
+Pasado REVALIDAR_SEGUNDOS se revalida contra el origen con If-None-Match /
+If-Modified-Since (un 304 solo renueva la marca); si el origen falla se sigue
+sirviendo la copia guardada y no se vuelve a intentar hasta REINTENTO_SEGUNDOS
+después, para que una caída del origen no deje hilos esperando su timeout en
+cada petición. Las descargas simultáneas de una misma URL en un worker se
+hacen una sola vez: los demás hilos esperan y usan el resultado.
+
+La carpeta tiene un tope de bytes: al superarlo se borran las imágenes menos
+usadas recientemente (cada acierto actualiza el mtime del archivo, que hace
+de marca LRU). Solo se espejan hosts permitidos, para no ser un proxy abierto;
+las redirecciones del origen también tienen que quedar dentro de esos hosts.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import urllib.error
+import urllib.request
+import uuid
+from urllib.parse import urlparse
+
+TAMANIO_BLOQUE = 64 * 1024
+TIMEOUT_SEGUNDOS = 10
+# Tras una falla del origen, cuándo volver a intentar
+REINTENTO_SEGUNDOS = 10 * 60
+# Al podar se libera hasta este porcentaje del tope, para no podar en cada descarga
+FRACCION_PODA = 0.9
+
+
+class ErrorEspejo(Exception):
+    """No se pudo obtener la imagen; `status` es el código HTTP a responder"""
+
+    def __init__(self, mensaje, status=502):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def host_permitido(url, hosts):
+    partes = urlparse(url or '')
+    return partes.scheme in ('http', 'https') and partes.hostname in hosts
+
+
+class _RedireccionRestringida(urllib.request.HTTPRedirectHandler):
+    """Sigue redirecciones solo hacia hosts permitidos"""
+
+    def __init__(self, hosts):
+        super().__init__()
+        self.hosts = hosts
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not host_permitido(newurl, self.hosts):
+            raise ErrorEspejo(f'El origen redirige a un host no permitido ({urlparse(newurl).hostname})')
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+class EspejoImagenes:
+    """Caché en disco, acotada por tamaño, de imágenes remotas"""
+
+    def __init__(self, carpeta, hosts, limite_bytes, revalidar_segundos, maximo_archivo):
+        self.carpeta = carpeta
+        self.hosts = hosts
+        self.limite_bytes = limite_bytes
+        self.revalidar_segundos = revalidar_segundos
+        self.maximo_archivo = maximo_archivo
+        self._lock = threading.Lock()
+        self._lock_descargas = threading.Lock()
+        self._descargas = {}  # ruta → [lock, hilos que lo usan]
+        self._fallas = {}  # ruta → momento de la última falla sin copia guardada
+        self._abridor = urllib.request.build_opener(_RedireccionRestringida(hosts))
+
+    def _rutas(self, url):
+        clave = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        ruta = os.path.join(self.carpeta, clave)
+        return ruta, f'{ruta}.json'
+
+    def _leer_meta(self, ruta, ruta_meta):
+        if not (os.path.exists(ruta) and os.path.exists(ruta_meta)):
+            return None
+        with open(ruta_meta, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _vigente(self, meta):
+        return meta is not None and time.time() - meta['verificado'] < self.revalidar_segundos
+
+    @contextmanager
+    def _lock_descarga(self, ruta):
+        """Lock por URL; se descarta cuando ningún hilo lo usa"""
+        with self._lock_descargas:
+            entrada = self._descargas.setdefault(ruta, [threading.Lock(), 0])
+            entrada[1] += 1
+        try:
+            with entrada[0]:
+                yield
+        finally:
+            with self._lock_descargas:
+                entrada[1] -= 1
+                if entrada[1] == 0:
+                    del self._descargas[ruta]
+
+    def _posponer(self, ruta_meta, meta):
+        """Marca la copia como verificada de modo que se reintente en REINTENTO_SEGUNDOS"""
+        meta['verificado'] = time.time() - self.revalidar_segundos + REINTENTO_SEGUNDOS
+        try:
+            self._guardar_meta(ruta_meta, meta)
+        except OSError:
+            pass
+
+    def _registrar_falla(self, ruta):
+        ahora = time.time()
+        with self._lock_descargas:
+            for clave, momento in list(self._fallas.items()):
+                if ahora - momento >= REINTENTO_SEGUNDOS:
+                    del self._fallas[clave]
+            self._fallas[ruta] = ahora
+
+    def obtener(self, url):
+        """Devuelve (ruta en disco, metadatos) de la imagen, descargándola o revalidándola si hace falta"""
+        os.makedirs(self.carpeta, exist_ok=True)
+        ruta, ruta_meta = self._rutas(url)
+        meta = self._leer_meta(ruta, ruta_meta)
+        if self._vigente(meta):
+            os.utime(ruta)
+            return ruta, meta
+
+        with self._lock_descarga(ruta):
+            # Otro hilo pudo haberla descargado o revalidado mientras esperábamos
+            meta = self._leer_meta(ruta, ruta_meta)
+            if self._vigente(meta):
+                os.utime(ruta)
+                return ruta, meta
+            falla = self._fallas.get(ruta)
+            if meta is None and falla and time.time() - falla < REINTENTO_SEGUNDOS:
+                raise ErrorEspejo('La imagen remota no está disponible por el momento')
+
+            # Si el origen falla (caído, o ahora devuelve algo inválido), mejor la
+            # copia vieja que una imagen rota
+            try:
+                meta = self._descargar(url, ruta, ruta_meta, meta)
+            except (ErrorEspejo, urllib.error.URLError, OSError, ValueError) as e:
+                if meta:
+                    self._posponer(ruta_meta, meta)
+                    return ruta, meta
+                self._registrar_falla(ruta)
+                if isinstance(e, ErrorEspejo):
+                    raise
+                raise ErrorEspejo(f'No se pudo obtener la imagen remota: {e}')
+            self._fallas.pop(ruta, None)
+            return ruta, meta
+
+    def _guardar_meta(self, ruta_meta, meta):
+        temporal = f'{ruta_meta}.{uuid.uuid4().hex}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(temporal, ruta_meta)
+
+    def _descargar(self, url, ruta, ruta_meta, meta):
+        pedido = urllib.request.Request(url, headers={'User-Agent': 'gestion-reservas-domos/espejo'})
+        if meta:
+            if meta.get('etag'):
+                pedido.add_header('If-None-Match', meta['etag'])
+            if meta.get('last_modified'):
+                pedido.add_header('If-Modified-Since', meta['last_modified'])
+
+        try:
+            respuesta = self._abridor.open(pedido, timeout=TIMEOUT_SEGUNDOS)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and meta:
+                meta['verificado'] = time.time()
+                self._guardar_meta(ruta_meta, meta)
+                os.utime(ruta)
+                return meta
+            raise
+
+        with respuesta:
+            if not host_permitido(respuesta.geturl(), self.hosts):
+                raise ErrorEspejo('La imagen remota terminó en un host no permitido')
+            tipo = respuesta.headers.get_content_type()
+            if not tipo.startswith('image/'):
+                raise ErrorEspejo(f'El origen no devolvió una imagen ({tipo})')
+            temporal = f'{ruta}.{uuid.uuid4().hex}.tmp'
+            hash_contenido = hashlib.sha256()
+            tamanio = 0
+            try:
+                with open(temporal, 'wb') as destino:
+                    while True:
+                        bloque = respuesta.read(TAMANIO_BLOQUE)
+                        if not bloque:
+                            break
+                        tamanio += len(bloque)
+                        if tamanio > self.maximo_archivo:
+                            raise ErrorEspejo('La imagen remota supera el tamaño máximo')
+                        hash_contenido.update(bloque)
+                        destino.write(bloque)
+                os.replace(temporal, ruta)
+            finally:
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+
+            meta = {
+                'url': url,
+                'tipo': tipo,
+                'tamanio': tamanio,
+                'sha256': hash_contenido.hexdigest(),
+                'etag': respuesta.headers.get('ETag'),
+                'last_modified': respuesta.headers.get('Last-Modified'),
+                'verificado': time.time()
+            }
+        self._guardar_meta(ruta_meta, meta)
+        self.podar()
+        return meta
+
+    def podar(self):
+        """Borra las imágenes menos usadas hasta quedar bajo el tope. Devuelve cuántas borró"""
+        with self._lock:
+            archivos = []
+            total = 0
+            for nombre in os.listdir(self.carpeta):
+                if nombre.endswith('.json') or nombre.endswith('.tmp'):
+                    continue
+                ruta = os.path.join(self.carpeta, nombre)
+                try:
+                    estado = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                archivos.append((estado.st_mtime, estado.st_size, ruta))
+                total += estado.st_size
+            if total <= self.limite_bytes:
+                return 0
+
+            borradas = 0
+            for _, tamanio, ruta in sorted(archivos):
+                if total <= self.limite_bytes * FRACCION_PODA:
+                    break
+                for archivo in (ruta, f'{ruta}.json'):
+                    if os.path.exists(archivo):
+                        os.remove(archivo)
+                total -= tamanio
+                borradas += 1
+            return borradas
@@ -0,0 +1,118 @@
+"""Exportación de reservas y pagos a CSV (en streaming) y XLSX.
+
+Los campos de texto libre se escapan contra inyección de fórmulas (un valor
+que empieza con `=`, `+`, `-` o `@` se exporta con un apóstrofo adelante).
+Las filas se recorren con `yield_per`, que en PostgreSQL usa un cursor del
+lado del servidor: la memoria no crece con el historial y el CSV empieza a
+enviarse apenas sale el primer lote.
+"""
+import csv
+import io
+import tempfile
+
+TAMANIO_LOTE = 500
+
+ENCABEZADOS_RESERVAS = [
+    'id', 'domo', 'cliente', 'email', 'telefono', 'fecha_inicio', 'fecha_fin',
+    'estado', 'tipo_check', 'fecha_creacion', 'monto_a_pagar', 'monto_pagado', 'estado_pago'
+]
+
+ENCABEZADOS_PAGOS = [
+    'reserva_id', 'domo', 'cliente', 'email', 'telefono', 'fecha_inicio', 'fecha_fin',
+    'estado_reserva', 'monto_a_pagar', 'monto_pagado', 'pendiente', 'estado_pago',
+    'nota_pago', 'instrucciones_enviadas'
+]
+
+
+# Excel y LibreOffice interpretan como fórmula una celda que empieza así
+INICIOS_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _fecha(valor):
+    return valor.isoformat() if valor else ''
+
+
+def _texto(valor):
+    """Texto cargado por clientes o el admin; con un apóstrofo adelante nunca se evalúa como fórmula"""
+    valor = valor or ''
+    return f"'{valor}" if valor.startswith(INICIOS_FORMULA) else valor
+
+
+def filas_reservas(consulta):
+    """Recorre (Reserva, ReservaPago, nombre del domo) en lotes y arma cada fila"""
+    for reserva, pago, domo_nombre in consulta.yield_per(TAMANIO_LOTE):
+        yield [
+            reserva.id,
+            _texto(domo_nombre),
+            _texto(reserva.nombre_cliente),
+            _texto(reserva.email_cliente),
+            _texto(reserva.telefono_cliente),
+            _fecha(reserva.fecha_inicio),
+            _fecha(reserva.fecha_fin),
+            reserva.estado,
+            reserva.tipo_check or 'normal',
+            _fecha(reserva.fecha_creacion),
+            pago.monto_a_pagar if pago else 0,
+            pago.monto_pagado if pago else 0,
+            pago.estado_pago if pago else 'pendiente'
+        ]
+
+
+def filas_pagos(consulta):
+    """Recorre (Reserva, ReservaPago, nombre del domo) en lotes y arma cada fila"""
+    for reserva, pago, domo_nombre in consulta.yield_per(TAMANIO_LOTE):
+        a_pagar = (pago.monto_a_pagar or 0) if pago else 0
+        pagado = (pago.monto_pagado or 0) if pago else 0
+        yield [
+            reserva.id,
+            _texto(domo_nombre),
+            _texto(reserva.nombre_cliente),
+            _texto(reserva.email_cliente),
+            _texto(reserva.telefono_cliente),
+            _fecha(reserva.fecha_inicio),
+            _fecha(reserva.fecha_fin),
+            reserva.estado,
+            a_pagar,
+            pagado,
+            a_pagar - pagado,
+            pago.estado_pago if pago else 'pendiente',
+            _texto(pago.nota_pago) if pago else '',
+            'si' if pago and pago.instrucciones_enviadas else 'no'
+        ]
+
+
+def generar_csv(encabezados, filas):
+    """Genera el CSV por bloques de texto. Empieza con BOM para que Excel respete los acentos"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')
+    escritor.writerow(encabezados)
+    for i, fila in enumerate(filas, start=1):
+        escritor.writerow(fila)
+        if i % TAMANIO_LOTE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generar_xlsx(encabezados, filas, titulo):
+    """Escribe un XLSX en modo write-only a un archivo temporal y lo devuelve posicionado al inicio.
+
+    Requiere openpyxl (opcional); si no está instalado lanza RuntimeError.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError('Exportación XLSX no disponible: falta instalar openpyxl')
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(title=titulo)
+    hoja.append(encabezados)
+    for fila in filas:
+        hoja.append(fila)
+
+    archivo = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
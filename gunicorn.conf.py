@@ -0,0 +1,37 @@
+"""Configuración de gunicorn (se toma sola desde el directorio del proyecto).
+
+app.py no hace I/O de base al importarse, así que la app se precarga una vez
+en el master y los workers la heredan por fork. Cada worker verifica el
+esquema y calienta sus cachés antes de aceptar tráfico.
+
+Distribución: WEB_CONCURRENCY procesos (por defecto 2 por CPU, máx. 8) con
+GUNICORN_THREADS hilos cada uno (gthread, por defecto 4). Las rutas pasan la
+mayor parte del tiempo esperando a la base, así que los hilos rinden más que
+sumar procesos; cada proceso tiene su propio pool de conexiones del mismo
+tamaño que sus hilos (ver config.opciones_engine).
+"""
+import multiprocessing
+import os
+
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', min(2 * multiprocessing.cpu_count(), 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 20
+keepalive = 5
+# Reciclar workers de a poco evita que la memoria crezca sin límite
+max_requests = 2000
+max_requests_jitter = 200
+
+
+def post_fork(server, worker):
+    # El engine no conectó antes del fork; igual, cada worker arranca con un pool propio
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    from app import preparar_worker
+    preparar_worker()
@@ -0,0 +1,132 @@
+"""Variantes responsivas de las imágenes subidas (galería y promociones).
+
+Al subir una imagen se encola un trabajo en un pool de hilos del worker que
+genera, para cada ancho de ANCHOS menor al original, una versión WebP y otra
+JPEG en static/uploads/variantes. Al terminar, las registra en las filas de
+`galeria_fotos` / `promociones` que usen esa imagen e invalida el catálogo; si
+la fila se crea después, `variantes_de` las encuentra en disco.
+
+Requiere Pillow (opcional): sin Pillow las imágenes se sirven como siempre,
+solo el original.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow es opcional
+    Image = None
+
+from models import db, GaleriaFoto, Promocion
+
+ANCHOS = (480, 960, 1600)
+CALIDAD_WEBP = 78
+CALIDAD_JPEG = 82
+CARPETA_VARIANTES = 'variantes'
+PREFIJO_UPLOADS = '/static/uploads/'
+
+_ejecutor = None
+_lock = threading.Lock()
+
+
+def pillow_disponible():
+    return Image is not None
+
+
+def _ejecutor_imagenes():
+    global _ejecutor
+    with _lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='imagenes')
+        return _ejecutor
+
+
+def _base(url):
+    return os.path.splitext(url[len(PREFIJO_UPLOADS):])[0]
+
+
+def _ruta_original(app, url):
+    return os.path.join(app.config['UPLOAD_FOLDER'], url[len(PREFIJO_UPLOADS):])
+
+
+def _ruta_variante(app, base, ancho, formato):
+    return os.path.join(app.config['UPLOAD_FOLDER'], CARPETA_VARIANTES, f'{base}_{ancho}.{formato}')
+
+
+def _url_variante(base, ancho, formato):
+    return f'{PREFIJO_UPLOADS}{CARPETA_VARIANTES}/{base}_{ancho}.{formato}'
+
+
+def es_imagen_local(url):
+    return bool(url) and url.startswith(PREFIJO_UPLOADS) and '/' not in url[len(PREFIJO_UPLOADS):]
+
+
+def variantes_de(app, url):
+    """Variantes ya generadas en disco: [{'ancho', 'webp', 'jpg'}] de menor a mayor"""
+    if not es_imagen_local(url):
+        return []
+    base = _base(url)
+    return [
+        {'ancho': ancho, 'webp': _url_variante(base, ancho, 'webp'), 'jpg': _url_variante(base, ancho, 'jpg')}
+        for ancho in ANCHOS
+        if os.path.exists(_ruta_variante(app, base, ancho, 'webp')) and os.path.exists(_ruta_variante(app, base, ancho, 'jpg'))
+    ]
+
+
+def generar_variantes(app, url):
+    """Genera las variantes de una imagen local. Devuelve la lista generada"""
+    ruta = _ruta_original(app, url)
+    base = _base(url)
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], CARPETA_VARIANTES), exist_ok=True)
+
+    with Image.open(ruta) as original:
+        # Respetar la orientación EXIF de las fotos de celular
+        imagen = ImageOps.exif_transpose(original)
+        if imagen.mode not in ('RGB', 'RGBA'):
+            imagen = imagen.convert('RGBA' if 'transparency' in imagen.info else 'RGB')
+        ancho_original = imagen.width
+        for ancho in ANCHOS:
+            # No agrandar: el ancho más chico se genera igual para las miniaturas
+            if ancho > ancho_original and ancho != ANCHOS[0]:
+                continue
+            alto = round(imagen.height * min(ancho, ancho_original) / ancho_original)
+            reducida = imagen.resize((min(ancho, ancho_original), alto), Image.LANCZOS)
+            for formato, opciones in (('webp', {'quality': CALIDAD_WEBP, 'method': 4}),
+                                      ('jpg', {'quality': CALIDAD_JPEG, 'optimize': True, 'progressive': True})):
+                destino = _ruta_variante(app, base, ancho, formato)
+                temporal = f'{destino}.tmp'
+                salida = reducida.convert('RGB') if formato == 'jpg' else reducida
+                salida.save(temporal, format='WEBP' if formato == 'webp' else 'JPEG', **opciones)
+                os.replace(temporal, destino)
+    return variantes_de(app, url)
+
+
+def registrar_variantes(url, variantes):
+    """Guarda las variantes en las filas que usan la imagen (el llamador hace commit)"""
+    valor = json.dumps(variantes)
+    GaleriaFoto.query.filter_by(url=url).update({'variantes': valor}, synchronize_session=False)
+    Promocion.query.filter_by(image_url=url).update({'variantes': valor}, synchronize_session=False)
+
+
+def _trabajo(app, url, al_terminar):
+    with app.app_context():
+        try:
+            variantes = generar_variantes(app, url)
+            registrar_variantes(url, variantes)
+            al_terminar()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error generando variantes de {url}: {e}")
+
+
+def encolar_variantes(app, url, al_terminar=lambda: None):
+    """Encola la generación de variantes de una imagen subida; no bloquea la petición.
+
+    `al_terminar` corre dentro de la transacción que registra las variantes.
+    """
+    if not pillow_disponible() or not es_imagen_local(url):
+        return None
+    return _ejecutor_imagenes().submit(_trabajo, app, url, al_terminar)
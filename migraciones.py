@@ -0,0 +1,225 @@
+"""Migraciones de esquema versionadas.
+
+Cada migración tiene un número creciente y se registra en `version_esquema` al
+aplicarse. `flask --app app db-upgrade` aplica las pendientes una vez por
+deploy; al arrancar, cada worker solo consulta la versión (una fila) y migra
+únicamente si la base quedó atrás.
+
+La migración 1 crea las tablas que falten con `create_all`, así que en una
+base nueva las siguientes encuentran sus columnas ya creadas: todas deben
+verificar antes de modificar (como hacía `asegurar_columnas`).
+"""
+import hashlib
+from contextlib import contextmanager
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+try:
+    import fcntl
+except ImportError:  # fuera de POSIX no hay lock de archivo para SQLite
+    fcntl = None
+
+from models import db, VersionEsquema, ArchivoDocumento, LoteEnvio
+
+# Clave del advisory lock de PostgreSQL que serializa migraciones concurrentes
+CLAVE_LOCK_MIGRACIONES = 72410013
+
+
+def _columnas(tabla):
+    inspector = inspect(db.engine)
+    if not inspector.has_table(tabla):
+        return None
+    return [col['name'] for col in inspector.get_columns(tabla)]
+
+
+def _m001_tablas_base():
+    db.create_all()
+
+
+def _m002_columnas_promociones_reservas():
+    columnas = _columnas('promociones')
+    if columnas is not None and 'image_url' not in columnas:
+        db.session.execute(text('ALTER TABLE promociones ADD COLUMN image_url VARCHAR(500)'))
+
+    columnas = _columnas('reservas')
+    if columnas is not None and 'tipo_check' not in columnas:
+        db.session.execute(text("ALTER TABLE reservas ADD COLUMN tipo_check VARCHAR(20) DEFAULT 'normal'"))
+
+
+def _m003_columnas_documentos():
+    columnas = _columnas('documentos_instrucciones')
+    if columnas is None:
+        return
+
+    # Compatibilidad: versiones anteriores usaban archivo_pdf
+    if 'archivo_url' not in columnas:
+        db.session.execute(text('ALTER TABLE documentos_instrucciones ADD COLUMN archivo_url VARCHAR(500)'))
+        if 'archivo_pdf' in columnas:
+            db.session.execute(text('UPDATE documentos_instrucciones SET archivo_url = archivo_pdf WHERE archivo_url IS NULL'))
+
+    # Compatibilidad: usar es_activo como columna base
+    if 'es_activo' not in columnas:
+        db.session.execute(text('ALTER TABLE documentos_instrucciones ADD COLUMN es_activo BOOLEAN DEFAULT FALSE'))
+        if 'activo' in columnas:
+            db.session.execute(text('UPDATE documentos_instrucciones SET es_activo = activo WHERE es_activo IS NULL'))
+
+    # Respaldo en base para entornos efímeros (Railway)
+    if 'archivo_blob' not in columnas:
+        tipo = 'BYTEA' if db.engine.dialect.name == 'postgresql' else 'BLOB'
+        db.session.execute(text(f'ALTER TABLE documentos_instrucciones ADD COLUMN archivo_blob {tipo}'))
+
+
+def _m004_indice_fecha_inicio():
+    # Índice para la paginación del listado de admin
+    db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_reservas_fecha_inicio ON reservas (fecha_inicio)'))
+
+
+def _m005_exclusion_reservas():
+    """PostgreSQL: la base rechaza reservas confirmadas superpuestas del mismo domo"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    existe = db.session.execute(text(
+        "SELECT 1 FROM pg_constraint WHERE conname = 'reservas_sin_superposicion'"
+    )).first()
+    if existe:
+        return
+    try:
+        db.session.execute(text('CREATE EXTENSION IF NOT EXISTS btree_gist'))
+        db.session.execute(text("""
+            ALTER TABLE reservas ADD CONSTRAINT reservas_sin_superposicion
+            EXCLUDE USING gist (domo_id WITH =, daterange(fecha_inicio, fecha_fin) WITH &&)
+            WHERE (estado = 'confirmada')
+        """))
+    except Exception as e:
+        # Sin permisos para la extensión o con datos superpuestos previos: queda el lock por domo
+        db.session.rollback()
+        print(f"✗ No se pudo crear la restricción de exclusión de reservas: {e}")
+
+
+def _m006_almacen_documentos():
+    """Almacén de PDFs por SHA-256: traslada los blobs de cada documento, sin duplicados"""
+    ArchivoDocumento.__table__.create(db.engine, checkfirst=True)
+    columnas = _columnas('documentos_instrucciones')
+    if columnas is None:
+        return
+    if 'sha256' not in columnas:
+        db.session.execute(text('ALTER TABLE documentos_instrucciones ADD COLUMN sha256 VARCHAR(64)'))
+    if 'tamanio' not in columnas:
+        db.session.execute(text('ALTER TABLE documentos_instrucciones ADD COLUMN tamanio INTEGER'))
+    db.session.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_documentos_instrucciones_sha256 ON documentos_instrucciones (sha256)'
+    ))
+
+    ids = db.session.execute(text(
+        'SELECT id FROM documentos_instrucciones WHERE sha256 IS NULL AND archivo_blob IS NOT NULL'
+    )).scalars().all()
+    for documento_id in ids:
+        # De a un documento para no cargar todos los PDFs juntos en memoria
+        contenido = db.session.execute(
+            text('SELECT archivo_blob FROM documentos_instrucciones WHERE id = :id'), {'id': documento_id}
+        ).scalar()
+        sha256 = hashlib.sha256(contenido).hexdigest()
+        if db.session.get(ArchivoDocumento, sha256) is None:
+            db.session.add(ArchivoDocumento(sha256=sha256, tamanio=len(contenido), contenido=contenido))
+            db.session.flush()
+        db.session.execute(text(
+            'UPDATE documentos_instrucciones SET sha256 = :sha256, tamanio = :tamanio, archivo_blob = NULL WHERE id = :id'
+        ), {'sha256': sha256, 'tamanio': len(contenido), 'id': documento_id})
+
+
+def _m007_variantes_imagenes():
+    for tabla in ('galeria_fotos', 'promociones'):
+        columnas = _columnas(tabla)
+        if columnas is not None and 'variantes' not in columnas:
+            db.session.execute(text(f'ALTER TABLE {tabla} ADD COLUMN variantes TEXT'))
+
+
+def _m008_lotes_envio():
+    LoteEnvio.__table__.create(db.engine, checkfirst=True)
+
+
+MIGRACIONES = [
+    (1, 'Tablas base', _m001_tablas_base),
+    (2, 'Columnas promociones.image_url y reservas.tipo_check', _m002_columnas_promociones_reservas),
+    (3, 'Columnas de compatibilidad de documentos_instrucciones', _m003_columnas_documentos),
+    (4, 'Índice reservas.fecha_inicio', _m004_indice_fecha_inicio),
+    (5, 'Restricción de exclusión de reservas (PostgreSQL)', _m005_exclusion_reservas),
+    (6, 'Almacén de documentos por SHA-256', _m006_almacen_documentos),
+    (7, 'Variantes responsivas de galeria_fotos y promociones', _m007_variantes_imagenes),
+    (8, 'Lotes de envío masivo de instrucciones', _m008_lotes_envio),
+]
+
+ULTIMA_VERSION = MIGRACIONES[-1][0]
+
+
+def version_esquema():
+    """Última migración aplicada (0 si la base todavía no tiene `version_esquema`)"""
+    try:
+        return db.session.execute(text('SELECT MAX(version) FROM version_esquema')).scalar() or 0
+    except Exception:
+        db.session.rollback()
+        return 0
+
+
+@contextmanager
+def _lock_migraciones():
+    """Serializa a quienes migran a la vez (deploy y workers arrancando).
+
+    En PostgreSQL con un advisory lock; en SQLite con un lock de archivo junto a
+    la base, ya que todos los workers corren en la misma máquina.
+    """
+    dialecto = db.engine.dialect.name
+    if dialecto == 'postgresql':
+        with db.engine.connect() as conexion:
+            conexion.execute(text('SELECT pg_advisory_lock(:clave)'), {'clave': CLAVE_LOCK_MIGRACIONES})
+            try:
+                yield
+            finally:
+                conexion.execute(text('SELECT pg_advisory_unlock(:clave)'), {'clave': CLAVE_LOCK_MIGRACIONES})
+        return
+
+    ruta = db.engine.url.database
+    if dialecto != 'sqlite' or fcntl is None or not ruta or ruta == ':memory:':
+        yield
+        return
+    with open(f'{ruta}.migraciones.lock', 'a') as archivo:
+        fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def aplicar_migraciones(sembrar=None):
+    """Aplica en orden las migraciones pendientes. Devuelve los números aplicados.
+
+    `sembrar`, si se pasa, corre dentro del mismo lock después de migrar, para
+    que dos procesos no carguen a la vez los datos por defecto.
+    """
+    aplicadas = []
+    with _lock_migraciones():
+        VersionEsquema.__table__.create(db.engine, checkfirst=True)
+        actual = version_esquema()
+        for version, descripcion, migracion in MIGRACIONES:
+            if version <= actual:
+                continue
+            try:
+                migracion()
+                db.session.add(VersionEsquema(version=version, descripcion=descripcion))
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                if db.session.get(VersionEsquema, version) is None:
+                    raise
+                # Otro proceso la registró mientras tanto (sin lock disponible);
+                # las migraciones verifican antes de modificar, así que ya está aplicada
+                continue
+            except Exception:
+                db.session.rollback()
+                raise
+            aplicadas.append(version)
+            print(f"✓ Migración {version}: {descripcion}")
+        if sembrar is not None:
+            sembrar()
+    return aplicadas
@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import json
 
 db = SQLAlchemy()
 
@@ -42,7 +43,7 @@ class Reserva(db.Model):
     telefono_cliente = db.Column(db.String(20))
     
     # Fechas de la reserva
-    fecha_inicio = db.Column(db.Date, nullable=False)
+    fecha_inicio = db.Column(db.Date, nullable=False, index=True)
     fecha_fin = db.Column(db.Date, nullable=False)
     
     # Estado
@@ -63,6 +64,24 @@ class Reserva(db.Model):
             'tipo_check': self.tipo_check
         }
 
+class OcupacionDomo(db.Model):
+    """Mapa de ocupación de un domo en un año: un bit por noche (derivado de reservas)"""
+    __tablename__ = 'ocupacion_domos'
+    __table_args__ = (db.UniqueConstraint('domo_id', 'anio', name='uq_ocupacion_domo_anio'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    domo_id = db.Column(db.Integer, db.ForeignKey('domos.id'), nullable=False)
+    anio = db.Column(db.Integer, nullable=False)
+    bits = db.Column(db.LargeBinary, nullable=False)
+
+class VersionEsquema(db.Model):
+    """Migraciones de esquema aplicadas (ver migraciones.py)"""
+    __tablename__ = 'version_esquema'
+
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    descripcion = db.Column(db.String(200))
+    fecha_aplicada = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Configuracion(db.Model):
     """Modelo para guardar configuraciones del sistema"""
     __tablename__ = 'configuracion'
@@ -105,6 +124,8 @@ class GaleriaFoto(db.Model):
     url = db.Column(db.String(500), nullable=False)
     titulo = db.Column(db.String(120))
     orden = db.Column(db.Integer, default=0)
+    # JSON [{ancho, webp, jpg}] generado por imagenes.py
+    variantes = db.Column(db.Text)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
 
     def to_dict(self):
@@ -112,7 +133,8 @@ class GaleriaFoto(db.Model):
             'id': self.id,
             'url': self.url,
             'titulo': self.titulo,
-            'orden': self.orden
+            'orden': self.orden,
+            'variantes': json.loads(self.variantes) if self.variantes else []
         }
 
 
@@ -126,6 +148,8 @@ class Promocion(db.Model):
     detalle = db.Column(db.String(200))
     activo = db.Column(db.Boolean, default=True)
     image_url = db.Column(db.String(500))
+    # JSON [{ancho, webp, jpg}] generado por imagenes.py
+    variantes = db.Column(db.Text)
     orden = db.Column(db.Integer, default=0)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -137,10 +161,21 @@ class Promocion(db.Model):
             'detalle': self.detalle,
             'activo': self.activo,
             'image_url': self.image_url,
+            'variantes': json.loads(self.variantes) if self.variantes else [],
             'orden': self.orden
         }
 
 
+class ArchivoDocumento(db.Model):
+    """Contenido de un PDF direccionado por su SHA-256: cada archivo distinto se guarda una vez"""
+    __tablename__ = 'archivos_documentos'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    tamanio = db.Column(db.Integer, nullable=False)
+    contenido = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class DocumentoInstrucciones(db.Model):
     """PDFs predefinidos de instrucciones para huéspedes"""
     __tablename__ = 'documentos_instrucciones'
@@ -149,7 +184,10 @@ class DocumentoInstrucciones(db.Model):
     nombre = db.Column(db.String(150), nullable=False)
     # Compatibilidad BD existente: la columna física es archivo_pdf (NOT NULL)
     archivo_url = db.Column('archivo_pdf', db.String(500), nullable=False)
-    archivo_blob = db.Column(db.LargeBinary)
+    # Respaldo de documentos previos al almacén por hash (la migración 6 los traslada)
+    archivo_blob = db.deferred(db.Column(db.LargeBinary))
+    sha256 = db.Column(db.String(64), db.ForeignKey('archivos_documentos.sha256'), index=True)
+    tamanio = db.Column(db.Integer)
     descripcion = db.Column(db.String(300))
     activo = db.Column('es_activo', db.Boolean, default=False)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
@@ -159,6 +197,8 @@ class DocumentoInstrucciones(db.Model):
             'id': self.id,
             'nombre': self.nombre,
             'archivo_url': self.archivo_url,
+            'sha256': self.sha256,
+            'tamanio': self.tamanio,
             'descripcion': self.descripcion,
             'activo': self.activo,
             'fecha_creacion': self.fecha_creacion.isoformat()
@@ -191,3 +231,33 @@ class ReservaPago(db.Model):
             'instrucciones_enviadas': self.instrucciones_enviadas,
             'fecha_actualizacion': self.fecha_actualizacion.isoformat() if self.fecha_actualizacion else None
         }
+
+
+class LoteEnvio(db.Model):
+    """Envío masivo de instrucciones por email, con su avance (ver envios.py)"""
+    __tablename__ = 'lotes_envio_instrucciones'
+
+    id = db.Column(db.Integer, primary_key=True)
+    dias = db.Column(db.Integer, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    enviados = db.Column(db.Integer, nullable=False, default=0)
+    fallidos = db.Column(db.Integer, nullable=False, default=0)
+    sin_email = db.Column(db.Integer, nullable=False, default=0)
+    ultimo_error = db.Column(db.String(300))
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_fin = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'dias': self.dias,
+            'total': self.total,
+            'enviados': self.enviados,
+            'fallidos': self.fallidos,
+            'pendientes': max(self.total - self.enviados - self.fallidos, 0),
+            'sin_email': self.sin_email,
+            'terminado': self.fecha_fin is not None,
+            'ultimo_error': self.ultimo_error,
+            'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
+            'fecha_fin': self.fecha_fin.isoformat() if self.fecha_fin else None
+        }
@@ -0,0 +1,185 @@
+"""Mapa de ocupación persistente por domo y año.
+
+Cada fila de `ocupacion_domos` guarda un bit por noche del año (46 bytes). Se
+mantiene dentro de la misma transacción que crea, cancela o elimina reservas,
+así que verificar si un rango está libre o armar la ocupación de una ventana
+lee unos pocos bytes en lugar de recorrer el historial de reservas.
+
+Las filas que faltan (años sin tocar, bases previas a esta tabla) se arman al
+vuelo desde `reservas`; `reconstruir_ocupacion` regenera todo desde cero.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from models import db, Domo, Reserva, OcupacionDomo
+
+BYTES_POR_ANIO = 46  # 366 noches
+
+
+def bloquear_domo(domo_id):
+    """Serializa las escrituras de reservas de un domo hasta el fin de la transacción.
+
+    En PostgreSQL toma el lock de fila del domo (SELECT ... FOR UPDATE), así
+    que las reservas de otros domos siguen en paralelo. SQLite no tiene locks
+    de fila: un UPDATE sin efecto como primera sentencia toma el lock de
+    escritura de la base antes de leer, y los demás esperan (busy timeout) en
+    lugar de fallar por interbloqueo al pasar de lectura a escritura.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(text('UPDATE domos SET id = id WHERE id = :domo_id'), {'domo_id': domo_id})
+    else:
+        db.session.query(Domo.id).filter(Domo.id == domo_id).with_for_update().first()
+
+
+def _posicion(fecha):
+    return fecha.timetuple().tm_yday - 1
+
+
+def _noches_por_anio(fecha_inicio, fecha_fin):
+    """Parte [fecha_inicio, fecha_fin) en tramos que no cruzan de año"""
+    actual = fecha_inicio
+    while actual < fecha_fin:
+        fin_tramo = min(fecha_fin, date(actual.year + 1, 1, 1))
+        yield actual.year, actual, fin_tramo
+        actual = fin_tramo
+
+
+def _marcar(bits, fecha_inicio, fecha_fin, ocupado):
+    for pos in range(_posicion(fecha_inicio), _posicion(fecha_fin - timedelta(days=1)) + 1):
+        if ocupado:
+            bits[pos >> 3] |= 1 << (pos & 7)
+        else:
+            bits[pos >> 3] &= ~(1 << (pos & 7)) & 0xFF
+
+
+def _reservas_del_anio(domo_id, anio, excluir_id=None):
+    consulta = db.session.query(Reserva.fecha_inicio, Reserva.fecha_fin).filter(
+        Reserva.domo_id == domo_id,
+        Reserva.estado == 'confirmada',
+        Reserva.fecha_inicio < date(anio + 1, 1, 1),
+        Reserva.fecha_fin > date(anio, 1, 1)
+    )
+    if excluir_id is not None:
+        consulta = consulta.filter(Reserva.id != excluir_id)
+    return consulta.all()
+
+
+def _armar_bits(reservas, anio):
+    bits = bytearray(BYTES_POR_ANIO)
+    inicio_anio = date(anio, 1, 1)
+    fin_anio = date(anio + 1, 1, 1)
+    for fecha_inicio, fecha_fin in reservas:
+        desde = max(fecha_inicio, inicio_anio)
+        hasta = min(fecha_fin, fin_anio)
+        if desde < hasta:
+            _marcar(bits, desde, hasta, True)
+    return bits
+
+
+def _fila(domo_id, anio, bloquear=False):
+    consulta = OcupacionDomo.query.filter_by(domo_id=domo_id, anio=anio)
+    if bloquear:
+        consulta = consulta.with_for_update()
+    fila = consulta.first()
+    if fila is None:
+        fila = OcupacionDomo(
+            domo_id=domo_id,
+            anio=anio,
+            bits=bytes(_armar_bits(_reservas_del_anio(domo_id, anio), anio))
+        )
+        db.session.add(fila)
+        db.session.flush()
+    return fila
+
+
+def rango_ocupado(domo_id, fecha_inicio, fecha_fin, bloquear=False):
+    """Indica si alguna noche de [fecha_inicio, fecha_fin) está ocupada.
+
+    Con `bloquear=True` toma las filas con SELECT ... FOR UPDATE para que la
+    verificación y la marca posterior queden en la misma transacción.
+    """
+    for anio, desde, hasta in _noches_por_anio(fecha_inicio, fecha_fin):
+        bits = _fila(domo_id, anio, bloquear).bits
+        for pos in range(_posicion(desde), _posicion(hasta - timedelta(days=1)) + 1):
+            if bits[pos >> 3] & (1 << (pos & 7)):
+                return True
+    return False
+
+
+def ocupar_noches(domo_id, fecha_inicio, fecha_fin):
+    """Marca las noches de una reserva confirmada (el llamador hace commit)"""
+    for anio, desde, hasta in _noches_por_anio(fecha_inicio, fecha_fin):
+        fila = _fila(domo_id, anio, bloquear=True)
+        bits = bytearray(fila.bits)
+        _marcar(bits, desde, hasta, True)
+        fila.bits = bytes(bits)
+
+
+def liberar_noches(domo_id, fecha_inicio, fecha_fin, reserva_id=None):
+    """Libera las noches de una reserva cancelada o eliminada (el llamador hace commit).
+
+    Si quedara otra reserva confirmada superpuesta (datos previos a la
+    validación), sus noches se vuelven a marcar.
+    """
+    for anio, desde, hasta in _noches_por_anio(fecha_inicio, fecha_fin):
+        fila = _fila(domo_id, anio, bloquear=True)
+        bits = bytearray(fila.bits)
+        _marcar(bits, desde, hasta, False)
+        for otra_inicio, otra_fin in _reservas_del_anio(domo_id, anio, excluir_id=reserva_id):
+            otra_desde = max(otra_inicio, desde)
+            otra_hasta = min(otra_fin, hasta)
+            if otra_desde < otra_hasta:
+                _marcar(bits, otra_desde, otra_hasta, True)
+        fila.bits = bytes(bits)
+
+
+def ocupacion_ventana(domo_ids, desde, dias):
+    """{domo_id: bytearray} con 1 en cada noche ocupada de [desde, desde + dias)"""
+    hasta = desde + timedelta(days=dias)
+    anios = list(range(desde.year, (hasta - timedelta(days=1)).year + 1))
+    filas = OcupacionDomo.query.filter(
+        OcupacionDomo.domo_id.in_(list(domo_ids)),
+        OcupacionDomo.anio.in_(anios)
+    ).all()
+    bits_por_clave = {(f.domo_id, f.anio): f.bits for f in filas}
+
+    resultado = {}
+    for domo_id in domo_ids:
+        ocupacion = bytearray(dias)
+        for anio, tramo_desde, tramo_hasta in _noches_por_anio(desde, hasta):
+            bits = bits_por_clave.get((domo_id, anio))
+            if bits is None:
+                # Sin fila todavía: se calcula al vuelo (se persiste en la próxima escritura)
+                bits = _armar_bits(_reservas_del_anio(domo_id, anio), anio)
+            base = (tramo_desde - desde).days
+            primera = _posicion(tramo_desde)
+            for i in range((tramo_hasta - tramo_desde).days):
+                pos = primera + i
+                if bits[pos >> 3] & (1 << (pos & 7)):
+                    ocupacion[base + i] = 1
+        resultado[domo_id] = ocupacion
+    return resultado
+
+
+def reconstruir_ocupacion(domo_id=None):
+    """Regenera los mapas de ocupación desde `reservas`. Devuelve las filas creadas"""
+    borrar = OcupacionDomo.query
+    consulta = db.session.query(Reserva.domo_id, Reserva.fecha_inicio, Reserva.fecha_fin).filter(
+        Reserva.estado == 'confirmada'
+    )
+    if domo_id is not None:
+        borrar = borrar.filter_by(domo_id=domo_id)
+        consulta = consulta.filter(Reserva.domo_id == domo_id)
+    borrar.delete(synchronize_session=False)
+
+    mapas = {}
+    for fila in consulta.all():
+        for anio, desde, hasta in _noches_por_anio(fila.fecha_inicio, fila.fecha_fin):
+            bits = mapas.setdefault((fila.domo_id, anio), bytearray(BYTES_POR_ANIO))
+            _marcar(bits, desde, hasta, True)
+
+    for (domo, anio), bits in mapas.items():
+        db.session.add(OcupacionDomo(domo_id=domo, anio=anio, bits=bytes(bits)))
+    db.session.commit()
+    return len(mapas)
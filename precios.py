@@ -0,0 +1,208 @@
+"""Calendario de precios por noche con sumas acumuladas.
+
+Para cada domo se resuelve una sola vez el precio de cada noche de un horizonte
+móvil (semana, fin de semana o feriado) y se guardan las sumas acumuladas. El
+precio base de cualquier rango dentro del horizonte sale de una resta, sin
+recorrer las noches una por una.
+
+Las reglas (precios de domos, feriados y escalones de descuento) se compilan en
+una foto versionada que cada worker guarda en memoria. Las rutas de admin que
+modifican reglas incrementan la versión en `configuracion`; los workers la
+verifican cada VERIFICAR_VERSION_SEGUNDOS, así que en régimen estable una
+cotización no consulta la BD.
+"""
+import json
+import threading
+import time
+from datetime import date, timedelta
+from itertools import accumulate
+
+from models import db, Domo, Feriado, Configuracion
+from versiones import leer_version, incrementar_version
+
+# Horizonte precalculado: un mes hacia atrás y dos años hacia adelante
+DIAS_HORIZONTE_PASADO = 31
+DIAS_HORIZONTE = 2 * 366
+
+# Descuentos por cantidad de noches: (mínimo de noches, porcentaje)
+DESCUENTOS_DEFECTO = [(7, 0.15), (3, 0.10)]
+
+CLAVE_VERSION = 'version_precios'
+VERIFICAR_VERSION_SEGUNDOS = 5
+
+_reglas = None
+_verificado = 0.0
+_lock = threading.Lock()
+
+
+def es_noche_fin_semana(fecha, feriados):
+    # Viernes=4, Sábado=5, Domingo=6
+    return fecha in feriados or fecha.weekday() >= 4
+
+
+class CalendarioPrecios:
+    """Precio de cada noche de [inicio, inicio + dias) y sus sumas acumuladas"""
+
+    def __init__(self, precio_semana, precio_fin_semana, feriados, inicio, dias):
+        self.inicio = inicio
+        self.dias = dias
+        precios = [
+            precio_fin_semana if es_noche_fin_semana(inicio + timedelta(days=i), feriados) else precio_semana
+            for i in range(dias)
+        ]
+        self.precios = precios
+        self.acumulados = [0] + list(accumulate(precios))
+
+    def cubre(self, fecha_inicio, fecha_fin):
+        return self.inicio <= fecha_inicio and (fecha_fin - self.inicio).days <= self.dias
+
+    def precio_base(self, fecha_inicio, fecha_fin):
+        desde = (fecha_inicio - self.inicio).days
+        hasta = (fecha_fin - self.inicio).days
+        return round(self.acumulados[hasta] - self.acumulados[desde], 2)
+
+
+class ReglasPrecios:
+    """Foto inmutable de las reglas de precios en una versión dada"""
+
+    def __init__(self, version, domos, feriados, descuentos, capacidades=None):
+        self.version = version
+        self.domos = domos  # {domo_id: (precio_semana, precio_fin_semana)}
+        self.capacidades = capacidades or {}
+        self.feriados = frozenset(feriados)
+        self.descuentos = sorted(descuentos, reverse=True)
+        self._calendarios = {}
+
+    def calendario(self, domo_id, hoy=None):
+        """Calendario del domo para el horizonte actual (se construye una vez por día)"""
+        inicio = (hoy or date.today()) - timedelta(days=DIAS_HORIZONTE_PASADO)
+        guardado = self._calendarios.get(domo_id)
+        if guardado is None or guardado.inicio != inicio:
+            precio_semana, precio_fin_semana = self.domos[domo_id]
+            guardado = CalendarioPrecios(precio_semana, precio_fin_semana, self.feriados, inicio, DIAS_HORIZONTE)
+            self._calendarios[domo_id] = guardado
+        return guardado
+
+    def porcentaje_descuento(self, noches):
+        """Porcentaje del mayor escalón de descuento alcanzado por la cantidad de noches"""
+        for minimo, porcentaje in self.descuentos:
+            if noches >= minimo:
+                return porcentaje
+        return 0
+
+    def calendario_para(self, domo_id, fecha_inicio, fecha_fin):
+        """Calendario que cubre [fecha_inicio, fecha_fin): el del horizonte o uno puntual"""
+        calendario = self.calendario(domo_id)
+        if not calendario.cubre(fecha_inicio, fecha_fin):
+            precio_semana, precio_fin_semana = self.domos[domo_id]
+            calendario = CalendarioPrecios(
+                precio_semana, precio_fin_semana, self.feriados, fecha_inicio, (fecha_fin - fecha_inicio).days
+            )
+        return calendario
+
+    def cotizar(self, domo_id, fecha_inicio, fecha_fin, calendario=None):
+        """Cotiza una estadía de [fecha_inicio, fecha_fin) en el domo"""
+        noches = (fecha_fin - fecha_inicio).days
+        if calendario is None or not calendario.cubre(fecha_inicio, fecha_fin):
+            calendario = self.calendario_para(domo_id, fecha_inicio, fecha_fin)
+        precio_base = calendario.precio_base(fecha_inicio, fecha_fin)
+        descuento = precio_base * self.porcentaje_descuento(noches)
+        return {
+            'precio_base': int(precio_base),
+            'descuento': int(descuento),
+            'precio_total': int(precio_base - descuento),
+            'noches': noches
+        }
+
+
+def _pares_descuentos(data):
+    if isinstance(data, dict):
+        return list(data.items())
+    if isinstance(data, list):
+        return [
+            (d.get('dias', d.get('noches')), d.get('porcentaje', d.get('descuento')))
+            if isinstance(d, dict) else (None, None)
+            for d in data
+        ]
+    raise ValueError('Se espera {"noches": porcentaje} o una lista de {"dias", "porcentaje"}')
+
+
+def _escalon(minimo, porcentaje):
+    """(noches mínimas, porcentaje 0-100) → (noches, fracción); ValueError si no es válido"""
+    try:
+        minimo = int(minimo)
+        porcentaje = float(porcentaje)
+    except (TypeError, ValueError):
+        raise ValueError(f'Escalón inválido: {minimo!r} noches, {porcentaje!r}%')
+    if minimo < 1 or not 0 < porcentaje < 100:
+        raise ValueError(f'Escalón inválido: {minimo} noches, {porcentaje:g}% (noches >= 1, porcentaje entre 0 y 100)')
+    return minimo, porcentaje / 100
+
+
+def validar_descuentos(data):
+    """Valida lo que envía el admin. Devuelve [(noches, fracción)]; lanza ValueError con el primer error.
+
+    Acepta {"3": 10, "7": 15} o [{"dias": 3, "porcentaje": 10}, ...], con
+    porcentajes en escala 0-100. Una lista o dict vacío significa sin descuentos.
+    """
+    return [_escalon(minimo, porcentaje) for minimo, porcentaje in _pares_descuentos(data)]
+
+
+def parsear_descuentos(valor):
+    """Convierte el JSON guardado por gestionar_descuentos en [(noches, fracción)].
+
+    Sin fila guardada (None) o con JSON ilegible se usan DESCUENTOS_DEFECTO; un
+    valor vacío significa sin descuentos. Los escalones inválidos se ignoran.
+    """
+    if valor is None:
+        return list(DESCUENTOS_DEFECTO)
+    try:
+        pares = _pares_descuentos(json.loads(valor))
+    except (TypeError, ValueError):
+        return list(DESCUENTOS_DEFECTO)
+
+    descuentos = []
+    for minimo, porcentaje in pares:
+        try:
+            descuentos.append(_escalon(minimo, porcentaje))
+        except ValueError:
+            continue
+    return descuentos
+
+
+def _compilar_reglas(version):
+    filas = db.session.query(Domo.id, Domo.precio_semana, Domo.precio_fin_semana, Domo.capacidad).all()
+    domos = {d.id: (d.precio_semana, d.precio_fin_semana) for d in filas}
+    capacidades = {d.id: d.capacidad or 0 for d in filas}
+    feriados = {f.fecha for f in db.session.query(Feriado.fecha).all()}
+    config = db.session.query(Configuracion.valor).filter(Configuracion.clave == 'descuentos').first()
+    descuentos = parsear_descuentos(config.valor if config else None)
+    return ReglasPrecios(version, domos, feriados, descuentos, capacidades)
+
+
+def obtener_reglas():
+    """Devuelve la foto de reglas vigente, recompilándola si cambió la versión"""
+    global _reglas, _verificado
+    with _lock:
+        reglas, verificado = _reglas, _verificado
+    if reglas is not None and time.monotonic() - verificado < VERIFICAR_VERSION_SEGUNDOS:
+        return reglas
+
+    version = leer_version(CLAVE_VERSION)
+    if reglas is None or reglas.version != version:
+        reglas = _compilar_reglas(version)
+    with _lock:
+        _reglas, _verificado = reglas, time.monotonic()
+    return reglas
+
+
+def incrementar_version_precios():
+    """Incrementa la versión de reglas en la sesión actual (el llamador hace commit)"""
+    incrementar_version(CLAVE_VERSION)
+
+
+def invalidar_reglas():
+    """Descarta la foto local para que la próxima cotización la recompile"""
+    global _reglas
+    with _lock:
+        _reglas = None
@@ -1,13 +1,14 @@
 // ==================== VARIABLES GLOBALES ====================
 let domos = [];
 let selectedDomo = null;
-let fechasOcupadas = [];        // Fechas completamente ocupadas (rojo)
-let fechasCheckout = [];        // Fechas de salida (disponibles como entrada siguiente)
-let fechasInicioReserva = [];   // Fechas de inicio de reservas (disponibles como fecha_fin)
+let rangosOcupados = [];        // Pares [entrada, salida) de reservas confirmadas (ISO)
+let disponibilidadHasta = null; // Último día (ISO) cubierto por la ventana cargada
+let disponibilidadPorDomo = null; // Rangos de todos los domos precargados en una sola consulta
+let disponibilidadCargadaEn = 0;  // Date.now() de la última precarga
 let calendarioMes = new Date();
 let fechaInicioTemp = null;
 let fechaFinTemp = null;
-let galeriaFotos = [
+let galeriaFotos = [             // {url, variantes} (las por defecto no tienen variantes)
     'https://i.imgur.com/1rwus0F.jpg',
     'https://i.imgur.com/SdZazOK.jpg',
     'https://i.imgur.com/pfmT1Yo.jpg',
@@ -20,11 +21,13 @@ let galeriaFotos = [
     'https://i.imgur.com/lUI8A1z.jpg',
     'https://i.imgur.com/XEA5rpM.jpg',
     'https://i.imgur.com/B1ydkwh.jpg'
-];
+].map((url) => ({ url, variantes: [] }));
 let lightboxIndex = 0;
+let datosIniciales = null;      // Domos, galería y promociones embebidos en el HTML
 
 // ==================== INICIALIZACIÓN ====================
 document.addEventListener('DOMContentLoaded', () => {
+    datosIniciales = leerDatosIniciales();
     cargarDomos();
     setupFormListeners();
     cargarGaleria();
@@ -32,12 +35,30 @@ document.addEventListener('DOMContentLoaded', () => {
     setupHeaderScroll();
 });
 
+function leerDatosIniciales() {
+    const nodo = document.getElementById('datos-iniciales');
+    if (!nodo) return null;
+    try {
+        return JSON.parse(nodo.textContent);
+    } catch (error) {
+        return null;
+    }
+}
+
+// Usa la lista embebida en la página; si falta, la pide a la API
+async function obtenerLista(clave, url) {
+    if (datosIniciales && Array.isArray(datosIniciales[clave])) {
+        return datosIniciales[clave];
+    }
+    const res = await fetch(url);
+    return res.json();
+}
+
 async function cargarGaleria() {
     try {
-        const res = await fetch('/api/galeria');
-        const data = await res.json();
+        const data = await obtenerLista('galeria', '/api/galeria');
         const fotos = Array.isArray(data) && data.length
-            ? data.map((f) => f.url)
+            ? data.map((f) => ({ url: f.url, variantes: f.variantes || [] }))
             : galeriaFotos;
         galeriaFotos = fotos;
         renderGaleria(fotos);
@@ -46,19 +67,38 @@ async function cargarGaleria() {
     }
 }
 
+// ==================== IMÁGENES RESPONSIVAS ====================
+function srcsetDe(variantes, formato) {
+    return (variantes || []).map((v) => `${v[formato]} ${v.ancho}w`).join(', ');
+}
+
+// WebP y JPEG en varios anchos (el navegador elige según `sizes`); sin variantes, el original
+function imagenResponsiva(url, variantes, sizes, atributos) {
+    if (!variantes || !variantes.length) {
+        return `<img src="${url}" ${atributos}>`;
+    }
+    return `
+        <picture>
+            <source type="image/webp" srcset="${srcsetDe(variantes, 'webp')}" sizes="${sizes}">
+            <img src="${url}" srcset="${srcsetDe(variantes, 'jpg')}" sizes="${sizes}" ${atributos}>
+        </picture>
+    `;
+}
+
 function renderGaleria(fotos) {
     const grid = document.getElementById('galeriaGrid');
     if (!grid) return;
     const previewFotos = fotos.slice(0, 4);
     grid.innerHTML = previewFotos
-        .map((url, index) => {
+        .map((foto, index) => {
             const verMasClass = index === previewFotos.length - 1 ? ' ver-mas' : '';
             const verMasOverlay = index === previewFotos.length - 1
                 ? '<span class="ver-mas-overlay">Ver más</span>'
                 : '';
             return `
             <div class="galeria-item${verMasClass}">
-                <img src="${url}" alt="Foto ${index + 1}" onclick="abrirLightbox(${index})">
+                ${imagenResponsiva(foto.url, foto.variantes, '(max-width: 768px) 50vw, 25vw',
+                    `alt="Foto ${index + 1}" loading="lazy" decoding="async" onclick="abrirLightbox(${index})"`)}
                 ${verMasOverlay}
             </div>
         `;
@@ -70,15 +110,17 @@ async function cargarPromociones() {
     const grid = document.getElementById('promocionesGrid');
     if (!grid) return;
     try {
-        const res = await fetch('/api/promociones');
-        const data = await res.json();
+        const data = await obtenerLista('promociones', '/api/promociones');
         if (!Array.isArray(data) || data.length === 0) {
             grid.innerHTML = '<p class="loading">Consultá por futuras promociones</p>';
             return;
         }
         grid.innerHTML = data.map((promo) => `
             <div class="promo-card">
-                ${promo.image_url ? `<img class="promo-image" src="${promo.image_url}" alt="${promo.titulo}">` : ''}
+                ${promo.image_url
+                    ? imagenResponsiva(promo.image_url, promo.variantes, '(max-width: 768px) 100vw, 33vw',
+                        `class="promo-image" alt="${promo.titulo}" loading="lazy" decoding="async"`)
+                    : ''}
                 <h3>${promo.titulo}</h3>
                 <p>${promo.descripcion}</p>
                 ${promo.detalle ? `<span class="promo-badge">${promo.detalle}</span>` : ''}
@@ -108,7 +150,7 @@ function abrirLightbox(index) {
     const lightbox = document.getElementById('galeriaLightbox');
     const imagen = document.getElementById('lightboxImagen');
     if (!lightbox || !imagen) return;
-    imagen.src = galeriaFotos[lightboxIndex];
+    mostrarEnLightbox(imagen, galeriaFotos[lightboxIndex]);
     lightbox.classList.add('active');
 }
 
@@ -122,14 +164,19 @@ function navegarLightbox(direccion) {
     if (!galeriaFotos.length) return;
     lightboxIndex = (lightboxIndex + direccion + galeriaFotos.length) % galeriaFotos.length;
     const imagen = document.getElementById('lightboxImagen');
-    if (imagen) imagen.src = galeriaFotos[lightboxIndex];
+    if (imagen) mostrarEnLightbox(imagen, galeriaFotos[lightboxIndex]);
+}
+
+function mostrarEnLightbox(imagen, foto) {
+    imagen.srcset = srcsetDe(foto.variantes, 'jpg');
+    imagen.sizes = '100vw';
+    imagen.src = foto.url;
 }
 
 // ==================== CARGAR DOMOS ====================
 async function cargarDomos() {
     try {
-        const response = await fetch('/api/domos');
-        domos = await response.json();
+        domos = await obtenerLista('domos', '/api/domos');
         
         const container = document.getElementById('domosContainer');
         container.innerHTML = '';
@@ -143,6 +190,7 @@ async function cargarDomos() {
             const card = crearTarjetaDomo(domo);
             container.appendChild(card);
         }
+        cargarDisponibilidadDomos();
     } catch (error) {
         console.error('Error cargando domos:', error);
         document.getElementById('domosContainer').innerHTML = '<p class="loading">Error al cargar los domos</p>';
@@ -170,6 +218,7 @@ function crearTarjetaDomo(domo) {
         <div class="domo-content">
             <h2>${domo.nombre}</h2>
             <p class="domo-description">${domo.descripcion}</p>
+            <p class="domo-disponibilidad" id="disponibilidad-domo-${domo.id}"></p>
             
             <div class="domo-features">
                 <div class="feature">Wifi</div>
@@ -214,22 +263,19 @@ async function abrirReserva(domoId) {
     document.getElementById('telefonoCliente').value = '';
     document.getElementById('precioSection').style.display = 'none';
     
-    // Cargar fechas ocupadas y checkouts
-    try {
-        const res = await fetch(`/api/disponibilidad/${domoId}`);
-        const data = await res.json();
-        fechasOcupadas = data.ocupadas || [];
-        fechasCheckout = data.checkouts || [];
-        fechasInicioReserva = data.inicios || [];
-    } catch (error) {
-        console.error('Error cargando disponibilidad:', error);
-        fechasOcupadas = [];
-        fechasCheckout = [];
-        fechasInicioReserva = [];
+    // Cargar rangos ocupados de los próximos meses (precargados si ya están)
+    calendarioMes = new Date();
+    rangosOcupados = [];
+    disponibilidadHasta = null;
+    if (disponibilidadPorDomo && Date.now() - disponibilidadCargadaEn < VIGENCIA_DISPONIBILIDAD_MS) {
+        agregarRangos(disponibilidadPorDomo.domos[domoId] || []);
+        disponibilidadHasta = disponibilidadPorDomo.hasta;
+    } else {
+        const hoy = new Date();
+        await cargarDisponibilidad(domoId, new Date(hoy.getFullYear(), hoy.getMonth(), 1));
     }
     
     // Inicializar calendario único
-    calendarioMes = new Date();
     fechaInicioTemp = null;
     fechaFinTemp = null;
     
@@ -244,6 +290,99 @@ async function abrirReserva(domoId) {
     }, 100);
 }
 
+// ==================== DISPONIBILIDAD ====================
+const MESES_VENTANA_DISPONIBILIDAD = 12;
+// Pasado este tiempo la precarga puede no incluir reservas nuevas: el modal vuelve a consultar
+const VIGENCIA_DISPONIBILIDAD_MS = 2 * 60 * 1000;
+
+function formatoISO(fecha) {
+    const mes = String(fecha.getMonth() + 1).padStart(2, '0');
+    const dia = String(fecha.getDate()).padStart(2, '0');
+    return `${fecha.getFullYear()}-${mes}-${dia}`;
+}
+
+async function cargarDisponibilidad(domoId, desde) {
+    const hasta = new Date(desde.getFullYear(), desde.getMonth() + MESES_VENTANA_DISPONIBILIDAD, 0);
+    try {
+        const params = new URLSearchParams({
+            formato: 'rangos',
+            desde: formatoISO(desde),
+            hasta: formatoISO(hasta)
+        });
+        const res = await fetch(`/api/disponibilidad/${domoId}?${params}`);
+        const data = await res.json();
+        agregarRangos(data.rangos || []);
+        disponibilidadHasta = formatoISO(hasta);
+    } catch (error) {
+        console.error('Error cargando disponibilidad:', error);
+    }
+}
+
+async function cargarDisponibilidadDomos() {
+    const hoy = new Date();
+    const desde = new Date(hoy.getFullYear(), hoy.getMonth(), 1);
+    const hasta = new Date(desde.getFullYear(), desde.getMonth() + MESES_VENTANA_DISPONIBILIDAD, 0);
+    try {
+        const params = new URLSearchParams({ desde: formatoISO(desde), hasta: formatoISO(hasta) });
+        const res = await fetch(`/api/disponibilidad?${params}`);
+        if (!res.ok) return;
+        disponibilidadPorDomo = await res.json();
+        disponibilidadCargadaEn = Date.now();
+    } catch (error) {
+        console.error('Error cargando disponibilidad:', error);
+        return;
+    }
+
+    for (const domo of domos) {
+        const elemento = document.getElementById(`disponibilidad-domo-${domo.id}`);
+        if (!elemento) continue;
+        const libre = proximaNocheLibre(disponibilidadPorDomo.domos[domo.id] || [], formatoISO(hoy));
+        if (libre > disponibilidadPorDomo.hasta) {
+            elemento.textContent = 'Sin noches libres en los próximos meses';
+        } else {
+            const [year, month, day] = libre.split('-');
+            elemento.textContent = `Próxima noche libre: ${day}/${month}/${year}`;
+        }
+    }
+}
+
+function proximaNocheLibre(rangos, desdeStr) {
+    // Los rangos vienen ordenados por entrada: se salta cada reserva que cubre la fecha
+    let fecha = desdeStr;
+    for (const [inicio, fin] of rangos) {
+        if (inicio <= fecha && fecha < fin) {
+            fecha = fin;
+        }
+    }
+    return fecha;
+}
+
+function agregarRangos(rangos) {
+    const existentes = new Set(rangosOcupados.map(([inicio, fin]) => `${inicio}|${fin}`));
+    for (const [inicio, fin] of rangos) {
+        if (!existentes.has(`${inicio}|${fin}`)) {
+            rangosOcupados.push([inicio, fin]);
+        }
+    }
+}
+
+// Las fechas ISO se comparan como texto: 'YYYY-MM-DD' respeta el orden cronológico
+function estaOcupada(fechaStr) {
+    return rangosOcupados.some(([inicio, fin]) => inicio <= fechaStr && fechaStr < fin);
+}
+
+function esCheckout(fechaStr) {
+    return rangosOcupados.some(([, fin]) => fin === fechaStr);
+}
+
+function esInicioReserva(fechaStr) {
+    return rangosOcupados.some(([inicio]) => inicio === fechaStr);
+}
+
+function rangoConConflicto(fechaInicio, fechaFin) {
+    return rangosOcupados.some(([inicio, fin]) => inicio < fechaFin && fin > fechaInicio);
+}
+
 // ==================== CONSTRUIR CALENDARIO ====================
 function construirCalendario() {
     const mes = calendarioMes;
@@ -316,29 +455,29 @@ function construirCalendario() {
         btn.className = 'calendario-day';
         
         const esPasada = fecha < hoy;
-        const estaOcupada = fechasOcupadas.includes(fechaStr);
-        const esCheckout = fechasCheckout.includes(fechaStr);
-        const esInicioReserva = fechasInicioReserva.includes(fechaStr);
+        const ocupada = estaOcupada(fechaStr);
+        const checkout = esCheckout(fechaStr);
+        const inicioReserva = esInicioReserva(fechaStr);
         
         if (esPasada) {
             btn.classList.add('pasada');
             btn.disabled = true;
-        } else if (esInicioReserva && esCheckout) {
+        } else if (inicioReserva && checkout) {
             // Día con checkout y checkin: no hay medio día libre
             btn.classList.add('reserved');
             btn.disabled = false;
             btn.onclick = () => seleccionarFechaRango(fechaStr);
-        } else if (esInicioReserva) {
+        } else if (inicioReserva) {
             // Día de inicio: mitad verde/rojo (se puede terminar otra reserva ese día)
             btn.classList.add('checkin');
             btn.disabled = false;
             btn.onclick = () => seleccionarFechaRango(fechaStr);
-        } else if (esCheckout) {
+        } else if (checkout) {
             // Día de checkout: mitad verde/rojo (se puede iniciar otra reserva ese día)
             btn.classList.add('checkout');
             btn.disabled = false;
             btn.onclick = () => seleccionarFechaRango(fechaStr);
-        } else if (estaOcupada) {
+        } else if (ocupada) {
             // Noche ocupada completa
             btn.classList.add('reserved');
             btn.disabled = false;
@@ -379,8 +518,14 @@ function construirCalendario() {
 }
 
 // ==================== CAMBIAR MES ====================
-function cambiarMes(incremento) {
+async function cambiarMes(incremento) {
     calendarioMes.setMonth(calendarioMes.getMonth() + incremento);
+    const ultimoDiaMes = new Date(calendarioMes.getFullYear(), calendarioMes.getMonth() + 1, 0);
+    if (selectedDomo && disponibilidadHasta && formatoISO(ultimoDiaMes) > disponibilidadHasta) {
+        // Se salió de la ventana cargada: pedir los meses siguientes
+        const [year, month, day] = disponibilidadHasta.split('-').map(Number);
+        await cargarDisponibilidad(selectedDomo.id, new Date(year, month - 1, day + 1));
+    }
     construirCalendario();
 }
 
@@ -484,24 +629,9 @@ function validarFechasReservadas() {
     
     if (!fechaInicio || !fechaFin) return;
     
-    const inicio = new Date(fechaInicio);
-    const fin = new Date(fechaFin);
-    
-    let fechaActual = new Date(inicio);
-    let hayConflicto = false;
-    
     // Validar que NO haya conflicto en las fechas de estadía
     // Permite que fecha_fin sea igual a fecha_inicio de otra reserva (checkout/checkin mismo día)
-    while (fechaActual < fin) {
-        const fechaStr = fechaActual.toISOString().split('T')[0];
-        if (fechasOcupadas.includes(fechaStr)) {
-            hayConflicto = true;
-            break;
-        }
-        fechaActual.setDate(fechaActual.getDate() + 1);
-    }
-    
-    if (hayConflicto) {
+    if (rangoConConflicto(fechaInicio, fechaFin)) {
         mostrarError('Algunas fechas seleccionadas ya están reservadas (se muestran en rojo)');
     }
 }
@@ -591,6 +721,9 @@ async function enviarReserva(e) {
         } else {
             mostrarExito(result);
         }
+        // Reservado o rechazado, la precarga ya no refleja el estado actual
+        disponibilidadPorDomo = null;
+        cargarDisponibilidadDomos();
     } catch (error) {
         console.error('Error:', error);
         mostrarError('Error al crear la reserva. Intenta de nuevo.');
@@ -0,0 +1,98 @@
+"""Recepción de archivos subidos por bloques.
+
+El archivo se copia a un temporal en la carpeta de destino de a
+TAMANIO_BLOQUE bytes mientras se calcula su SHA-256, se validan los bytes
+mágicos del tipo declarado y se corta apenas supera el límite. Después se
+mueve con os.replace (atómico en el mismo disco), así que nunca hay un
+archivo a medias publicado ni un PDF entero en la memoria del worker.
+"""
+import hashlib
+import os
+import tempfile
+
+TAMANIO_BLOQUE = 64 * 1024
+
+
+def _es_webp(cabecera):
+    return cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WEBP'
+
+
+# Bytes mágicos por extensión
+FIRMAS = {
+    'pdf': lambda cabecera: cabecera.startswith(b'%PDF-'),
+    'png': lambda cabecera: cabecera.startswith(b'\x89PNG\r\n\x1a\n'),
+    'jpg': lambda cabecera: cabecera.startswith(b'\xff\xd8\xff'),
+    'jpeg': lambda cabecera: cabecera.startswith(b'\xff\xd8\xff'),
+    'webp': _es_webp,
+}
+
+
+class SubidaInvalida(ValueError):
+    """Archivo rechazado; `status` es el código HTTP a responder"""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+class ArchivoSubido:
+    """Archivo ya recibido en un temporal, con su hash y tamaño"""
+
+    def __init__(self, ruta, extension, sha256, tamanio):
+        self.ruta = ruta
+        self.extension = extension
+        self.sha256 = sha256
+        self.tamanio = tamanio
+
+    def mover(self, destino):
+        os.replace(self.ruta, destino)
+        self.ruta = destino
+
+    def leer(self):
+        with open(self.ruta, 'rb') as f:
+            return f.read()
+
+    def descartar(self):
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+
+def extension_de(filename):
+    return filename.rsplit('.', 1)[1].lower() if filename and '.' in filename else ''
+
+
+def recibir_archivo(file_storage, extensiones, limite_bytes, carpeta):
+    """Copia la subida a un temporal en `carpeta` validando tipo y tamaño.
+
+    Lanza SubidaInvalida (400 por tipo o archivo vacío, 413 por tamaño).
+    """
+    if not file_storage or not file_storage.filename:
+        raise SubidaInvalida('Archivo requerido')
+    extension = extension_de(file_storage.filename)
+    if extension not in extensiones:
+        raise SubidaInvalida(f"Archivo inválido. Formatos permitidos: {', '.join(sorted(extensiones))}")
+
+    descriptor, ruta = tempfile.mkstemp(dir=carpeta, suffix='.part')
+    hash_contenido = hashlib.sha256()
+    tamanio = 0
+    try:
+        with os.fdopen(descriptor, 'wb') as destino:
+            while True:
+                bloque = file_storage.stream.read(TAMANIO_BLOQUE)
+                if not bloque:
+                    break
+                if tamanio == 0 and not FIRMAS[extension](bloque):
+                    raise SubidaInvalida(f'El contenido no corresponde a un archivo {extension.upper()}')
+                tamanio += len(bloque)
+                if tamanio > limite_bytes:
+                    raise SubidaInvalida(f'El archivo supera el máximo de {limite_bytes // (1024 * 1024)} MB', 413)
+                hash_contenido.update(bloque)
+                destino.write(bloque)
+        if tamanio == 0:
+            raise SubidaInvalida('El archivo está vacío')
+    except Exception:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        raise
+
+    return ArchivoSubido(ruta, extension, hash_contenido.hexdigest(), tamanio)
@@ -0,0 +1,24 @@
+"""Contadores de versión en `configuracion` para invalidar cachés entre workers.
+
+Cada caché en memoria (reglas de precios, catálogo) tiene su clave. Las rutas
+de admin incrementan la versión dentro de la misma transacción que modifica
+los datos; los workers la leen cada tanto y descartan su copia si cambió.
+"""
+from models import db, Configuracion
+
+
+def leer_version(clave):
+    fila = db.session.query(Configuracion.valor).filter(Configuracion.clave == clave).first()
+    return fila.valor if fila else '0'
+
+
+def incrementar_version(clave):
+    """Incrementa la versión `clave` en la sesión actual (el llamador hace commit)"""
+    config = Configuracion.query.filter_by(clave=clave).with_for_update().first()
+    if not config:
+        db.session.add(Configuracion(clave=clave, valor='1', tipo='number'))
+        return
+    try:
+        config.valor = str(int(config.valor) + 1)
+    except ValueError:
+        config.valor = '1'